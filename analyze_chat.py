@@ -1,35 +1,45 @@
 # analyze_chat.py
+import argparse
+import time
 from pathlib import Path
+from typing import Dict, Optional
 
-from chat_parser import parse_chat
-from chat_stats import (
-    basic_stats,
-    daily_activity,
-    word_frequencies,
-    sentiment_scores,
-    confrontational_index,
-    pos_stats,
-    words_not_to_say,
+import chat_models
+import chat_profile
+from chat_cache import cache_path_for, load_cached_table
+from chat_cube import cube_is_current, cube_path_for, save_cube
+from chat_files import export_key
+from chat_pipeline import run_stages
+from chat_pos import DEFAULT_TAG_CACHE
+from chat_report import (
+    DAILY_POINT_BUDGET,
+    author_html,
+    daily_data_js,
+    write_html,
 )
-from chat_report import author_html, write_html
+from chat_table import load_table
 
 
-def main():
-    msgs = parse_chat("chat.txt")
-    if not msgs:
-        print("No messages parsed.")
-        return
+def report_stem(author: str) -> str:
+    return "".join(
+        c if c.isalnum() or c in ("-", "_") else "_" for c in author
+    )
 
-    stats_by_author = basic_stats(msgs)
-    daily_by_author = daily_activity(msgs)
-    words_by_author = word_frequencies(msgs)
-    sentiment_by_author = sentiment_scores(msgs)
-    confront_by_author = confrontational_index(msgs)
-    pos_by_author = pos_stats(msgs)
-    bad_words_by_author = words_not_to_say(msgs)
 
-    out_dir = Path("chat_reports")
-    out_dir.mkdir(exist_ok=True)
+def report_filename(author: str) -> str:
+    return f"{report_stem(author)}.html"
+
+
+def write_reports(
+    results: Dict[str, object], out_dir: Path, verbose: bool = True
+) -> None:
+    stats_by_author = results["basic"]
+    daily_by_author = results["daily"]
+    words_by_author = results["words"]
+    sentiment_by_author = results["sentiment"]
+    confront_by_author = results["confront"]
+    pos_by_author = results["pos"]
+    bad_words_by_author = results["bad_words"]
 
     for author, stats in stats_by_author.items():
         daily_counts = daily_by_author.get(author, {})
@@ -39,6 +49,13 @@ def main():
         pos_info = pos_by_author.get(author, {"nouns": [], "verbs": [], "adjectives": []})
         bad_words = bad_words_by_author.get(author, [])
         hourly_activity = stats.get("Hourly activity", [0] * 24)
+        heatmap = results.get("heatmap", {}).get(author)
+        conversation = results.get("sessions", {}).get(author)
+
+        daily_src = None
+        if len(daily_counts) > DAILY_POINT_BUDGET:
+            daily_src = f"{report_stem(author)}.daily.js"
+            write_html(out_dir / daily_src, daily_data_js(daily_counts))
 
         html = author_html(
             author,
@@ -50,14 +67,218 @@ def main():
             pos_info,
             bad_words,
             hourly_activity,
+            daily_src=daily_src,
+            heatmap=heatmap,
+            conversation=conversation,
         )
 
-        safe_name = "".join(
-            c if c.isalnum() or c in ("-", "_") else "_" for c in author
-        )
-        file_path = out_dir / f"{safe_name}.html"
+        file_path = out_dir / report_filename(author)
         write_html(file_path, html)
-        print(f"Wrote {file_path}")
+        if verbose:
+            print(f"Wrote {file_path}")
+
+
+def analyze(
+    chat: str,
+    out_dir,
+    jobs: int = 1,
+    use_cache: bool = True,
+    refresh_cache: bool = False,
+    incremental: bool = False,
+    fast_pos: bool = False,
+    pos_cache: Optional[str] = None,
+    dashboard: bool = False,
+    verbose: bool = True,
+    approx_words: Optional[int] = None,
+    cache_dir: Optional[str] = None,
+) -> Optional[Dict[str, object]]:
+    """Analyse one export and write its reports into ``out_dir``.
+
+    With ``dashboard=True`` a single dashboard (see chat_dashboard) is
+    written instead of one HTML file per author. The parse cache and
+    rollup cube are kept beside the export, or in ``cache_dir`` if given;
+    ``use_cache=False`` neither reads nor writes either of them. With
+    ``incremental=True`` the stages come from the checkpoint, so ``jobs``,
+    ``fast_pos`` and ``approx_words`` do not apply.
+    Returns the stage results, or None if no messages were parsed.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    cache_base = chat
+    if cache_dir is not None:
+        cache_base = str(Path(cache_dir) / Path(chat).name)
+    sentiment_cache = str(out_dir / ".sentiment_cache.json")
+    log = print if verbose else (lambda *a: None)
+
+    results = None
+    if incremental:
+        from chat_checkpoint import update_checkpoint
+
+        try:
+            with chat_profile.span("checkpoint"):
+                results, resumed = update_checkpoint(
+                    chat, str(out_dir / ".checkpoint.pkl"), sentiment_cache
+                )
+        except ValueError:
+            log("Export is not in chronological order; running a full analysis.")
+        else:
+            if results is None:
+                log("No messages parsed.")
+                return None
+            log("Resumed from checkpoint." if resumed else "Built checkpoint.")
+
+    if results is None:
+        if use_cache:
+            msgs = load_cached_table(
+                chat, refresh=refresh_cache, cache_path=cache_path_for(cache_base)
+            )
+        else:
+            msgs = load_table(chat)
+        if not msgs:
+            log("No messages parsed.")
+            return None
+        results = run_stages(
+            msgs,
+            jobs,
+            sentiment_cache=sentiment_cache,
+            fast_pos=fast_pos,
+            pos_cache=pos_cache or DEFAULT_TAG_CACHE,
+            approx_words=approx_words,
+        )
+
+    if use_cache:
+        # the cube only changes with the export; skip recompressing it
+        cube_path, key = cube_path_for(cache_base), export_key(chat)
+        if refresh_cache or not cube_is_current(cube_path, key):
+            save_cube(cube_path, results["cube"], key)
+
+    with chat_profile.span("write reports", len(results["basic"])):
+        if dashboard:
+            from chat_dashboard import write_dashboard
+
+            stems = {a: report_stem(a) for a in results["basic"]}
+            write_dashboard(results, out_dir, stems)
+            log(f"Wrote {out_dir / 'index.html'}")
+        else:
+            write_reports(results, out_dir, verbose)
+    return results
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        description="Write per-author HTML reports for a WhatsApp export."
+    )
+    ap.add_argument("chat", nargs="?", default="chat.txt")
+    ap.add_argument("--out", default="chat_reports", help="report directory")
+    ap.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse the export without reading or writing CHAT.cache.npz "
+        "(the CHAT.cube.npz rollup is not saved either)",
+    )
+    ap.add_argument(
+        "--refresh-cache",
+        action="store_true",
+        help="reparse the export and rewrite its cache",
+    )
+    ap.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="run independent analysis stages in N worker processes",
+    )
+    ap.add_argument(
+        "--fast-pos",
+        action="store_true",
+        help="tag each word type once instead of every token (approximate)",
+    )
+    ap.add_argument(
+        "--pos-cache",
+        default=None,
+        help="word->tag cache shared across runs in --fast-pos mode "
+        "(default: ~/.cache/whatsappbot/pos_tags.json)",
+    )
+    ap.add_argument(
+        "--approx-words",
+        type=int,
+        default=None,
+        metavar="N",
+        help="keep at most N candidate words per author (Space-Saving "
+        "sketch), counted straight from the message text in O(authors x N) "
+        "memory; counts are exact to within words/N",
+    )
+    ap.add_argument(
+        "--dashboard",
+        action="store_true",
+        help="write one shared dashboard (index.html plus per-author data "
+        "files) instead of an HTML file per author",
+    )
+    ap.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="load every NLTK resource up front and print its import/load "
+        "times (for this module's own imports, run python -X importtime)",
+    )
+    ap.add_argument(
+        "--profile",
+        action="store_true",
+        help="print per-stage wall/CPU time, item counts and peak RSS, and "
+        "write a Chrome trace to OUT/profile_trace.json",
+    )
+    ap.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="with --profile, also record peak Python heap per stage "
+        "(tracemalloc; slows the run down)",
+    )
+    ap.add_argument(
+        "--incremental",
+        action="store_true",
+        help="keep a checkpoint in the report directory and only analyse "
+        "what was appended to the export since the last run",
+    )
+    args = ap.parse_args(argv)
+    if args.approx_words is not None and args.approx_words < 1:
+        ap.error("--approx-words must be at least 1")
+    if args.incremental:
+        clash = [
+            flag for flag, on in (
+                ("--jobs", args.jobs != 1),
+                ("--fast-pos", args.fast_pos),
+                ("--approx-words", args.approx_words is not None),
+            ) if on
+        ]
+        if clash:
+            ap.error(f"--incremental cannot be combined with {', '.join(clash)}")
+
+    if args.startup_profile:
+        start = time.perf_counter()
+        chat_models.preload()
+        print(chat_models.startup_report(time.perf_counter() - start))
+
+    if args.profile:
+        chat_profile.enable(trace_memory=args.profile_memory)
+
+    with chat_profile.span("analyze_chat"):
+        analyze(
+            args.chat,
+            args.out,
+            jobs=args.jobs,
+            use_cache=not args.no_cache,
+            refresh_cache=args.refresh_cache,
+            incremental=args.incremental,
+            fast_pos=args.fast_pos,
+            pos_cache=args.pos_cache,
+            dashboard=args.dashboard,
+            approx_words=args.approx_words,
+        )
+
+    if args.profile:
+        trace_path = Path(args.out) / "profile_trace.json"
+        chat_profile.write_trace(str(trace_path))
+        print(chat_profile.report())
+        print(f"Trace written to {trace_path}")
 
 
 if __name__ == "__main__":
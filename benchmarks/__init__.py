@@ -0,0 +1 @@
+"""Benchmarks and synthetic exports; see benchmarks.run and benchmarks.generate."""
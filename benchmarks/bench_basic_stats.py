@@ -0,0 +1,51 @@
+"""Scaling of basic_stats with group size.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_basic_stats [--messages N]
+
+The message count is held fixed while the number of authors grows, so a
+linear engine shows roughly flat timings across the rows.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from chat_parser import Message
+from chat_stats import basic_stats
+
+GROUP_SIZES = (2, 10, 50, 100, 300)
+
+
+def synthetic_messages(n: int, n_authors: int, seed: int = 0):
+    rng = random.Random(seed)
+    authors = [f"Member {i}" for i in range(n_authors)]
+    ts = datetime(2020, 1, 1)
+    msgs = []
+    for _ in range(n):
+        ts += timedelta(minutes=rng.choice((0, 1, 1, 2, 5, 30, 600)))
+        words = " ".join("word" for _ in range(rng.randint(1, 12)))
+        msgs.append(Message(ts=ts, author=rng.choice(authors), text=words))
+    return msgs
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--messages", type=int, default=200_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    print(f"{'authors':>8} {'seconds':>10} {'msgs/s':>12}")
+    for n_authors in GROUP_SIZES:
+        msgs = synthetic_messages(args.messages, n_authors)
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            basic_stats(msgs)
+            best = min(best, time.perf_counter() - start)
+        print(f"{n_authors:>8} {best:>10.3f} {args.messages / best:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""decode_timestamp versus the strptime path it replaced.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_timestamps [--lines N]
+
+Both decoders are fed the same (date, time) pairs, drawn the way a real
+export looks: many lines per date and both plain and narrow no-break
+spaces before AM/PM. The outputs are checked for equality first.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from chat_parser import _decode_date, decode_timestamp
+
+
+def strptime_decode(d: str, t: str) -> datetime:
+    t_norm = t.replace("\u202f", " ").strip()
+    return datetime.strptime(f"{d} {t_norm}", "%m/%d/%y %I:%M %p")
+
+
+def sample_pairs(n: int, lines_per_day: int = 200, seed: int = 0):
+    rng = random.Random(seed)
+    ts = datetime(2019, 1, 1)
+    pairs = []
+    for i in range(n):
+        if i % lines_per_day == 0:
+            ts += timedelta(days=1)
+        ts = ts.replace(hour=rng.randrange(24), minute=rng.randrange(60))
+        d = f"{ts.month}/{ts.day}/{ts:%y}"
+        sep = rng.choice((" ", "\u202f"))
+        t = f"{ts.hour % 12 or 12}:{ts.minute:02d}{sep}{ts:%p}"
+        pairs.append((d, t))
+    return pairs
+
+
+def bench(fn, pairs, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        _decode_date.cache_clear()
+        start = time.perf_counter()
+        for d, t in pairs:
+            fn(d, t)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--lines", type=int, default=200_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    pairs = sample_pairs(args.lines)
+    for d, t in pairs:
+        assert decode_timestamp(d, t) == strptime_decode(d, t), (d, t)
+
+    slow = bench(strptime_decode, pairs, args.repeat)
+    fast = bench(decode_timestamp, pairs, args.repeat)
+    print(f"{'decoder':<18} {'seconds':>10} {'lines/s':>14}")
+    print(f"{'strptime':<18} {slow:>10.3f} {args.lines / slow:>14,.0f}")
+    print(f"{'decode_timestamp':<18} {fast:>10.3f} {args.lines / fast:>14,.0f}")
+    print(f"speedup: {slow / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
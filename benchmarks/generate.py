@@ -0,0 +1,145 @@
+"""Synthetic WhatsApp exports for benchmarking.
+
+Run from the repository root:
+
+    python -m benchmarks.generate OUT --lines 1000000 [--authors 8]
+
+Writes ``--lines`` lines in the chosen export format. The output has
+multi-line messages, blank continuation lines, ``<Media omitted>`` and
+"This message was deleted" placeholders, system lines, and (12-hour format)
+a mix of plain and narrow no-break spaces before AM/PM. The same seed gives
+the same file.
+"""
+import argparse
+import random
+from datetime import datetime, timedelta
+
+FORMAT_NAMES = ("us_12h", "dmy_24h", "ios")
+
+WORDS = (
+    "i you we they it the a an to of and in on for with at this that is was "
+    "are be have do not no yes so but just like what when where why how "
+    "ok okay lol haha yeah sure maybe really very too now later today "
+    "tomorrow tonight home work food pizza coffee beer dinner movie game "
+    "call text phone car train bus late early tired busy free weekend "
+    "love hate happy sad angry great good bad awful amazing stupid funny "
+    "sorry thanks please wait come go going went see saw know think want "
+    "need get got make made tell told said say sounds nice cool fine"
+).split()
+GAPS_MINUTES = (0, 0, 1, 1, 1, 2, 3, 5, 10, 30, 90, 600, 1440)
+ENCRYPTION_NOTICE = (
+    "Messages and calls are end-to-end encrypted. No one outside of this "
+    "chat, not even WhatsApp, can read or listen to them."
+)
+
+
+def author_names(n: int, rng: random.Random):
+    first = ("Alice", "Bob", "Carol", "Dan", "Erin", "Frank", "Grace", "Heidi",
+             "Ivan", "Judy", "Mallory", "Niaj", "Olivia", "Peggy", "Rupert")
+    names = []
+    for i in range(n):
+        name = first[i % len(first)]
+        if i >= len(first):
+            name += f" {i // len(first)}"
+        elif rng.random() < 0.3:
+            name += " " + rng.choice(("Smith", "O'Neil", "Nguyen", "García"))
+        names.append(name)
+    return names
+
+
+def stamp(fmt: str, t: datetime, rng: random.Random) -> str:
+    """The timestamp part of a message header, up to the author."""
+    if fmt == "us_12h":
+        # newer Android exports put U+202F before AM/PM
+        space = "\u202f" if rng.random() < 0.5 else " "
+        ampm = "AM" if t.hour < 12 else "PM"
+        return (
+            f"{t.month}/{t.day}/{t.year % 100:02d}, "
+            f"{t.hour % 12 or 12}:{t.minute:02d}{space}{ampm} - "
+        )
+    if fmt == "dmy_24h":
+        return f"{t.day:02d}/{t.month:02d}/{t.year}, {t.hour:02d}:{t.minute:02d} - "
+    return (
+        f"[{t.day:02d}/{t.month:02d}/{t.year % 100:02d}, "
+        f"{t.hour:02d}:{t.minute:02d}:{t.second:02d}] "
+    )
+
+
+def system_line(fmt: str, t: datetime, rng: random.Random) -> str:
+    if fmt == "ios":
+        return f"{stamp(fmt, t, rng)}Group: \u200e{ENCRYPTION_NOTICE}"
+    return stamp(fmt, t, rng) + ENCRYPTION_NOTICE
+
+
+def write_export(
+    path: str,
+    lines: int,
+    authors: int = 5,
+    fmt: str = "us_12h",
+    seed: int = 0,
+    multiline: float = 0.05,
+    media: float = 0.04,
+    deleted: float = 0.01,
+) -> int:
+    """Write a synthetic export of ``lines`` lines; returns messages written."""
+    rng = random.Random(seed)
+    names = author_names(authors, rng)
+    # a few people do most of the talking, as in real groups
+    weights = [1.0 / (i + 1) for i in range(authors)]
+    t = datetime(2019, 1, 1, 9, 0)
+
+    n_lines = n_msgs = 0
+    buf = [system_line(fmt, t, rng)]
+    n_lines += 1
+    with open(path, "w", encoding="utf8", newline="\n") as f:
+        while n_lines < lines:
+            t += timedelta(
+                minutes=rng.choice(GAPS_MINUTES), seconds=rng.randrange(60)
+            )
+            author = rng.choices(names, weights)[0]
+            header = f"{stamp(fmt, t, rng)}{author}: "
+            r = rng.random()
+            if r < media:
+                if fmt == "ios":
+                    header, text = "\u200e" + header, "\u200eimage omitted"
+                else:
+                    text = "<Media omitted>"
+            elif r < media + deleted:
+                text = "This message was deleted"
+            else:
+                text = " ".join(rng.choices(WORDS, k=rng.randint(1, 18)))
+            buf.append(header + text)
+            n_lines += 1
+            n_msgs += 1
+
+            if rng.random() < multiline:
+                for _ in range(rng.randint(1, 4)):
+                    if n_lines >= lines:
+                        break
+                    k = 0 if rng.random() < 0.2 else rng.randint(1, 10)
+                    buf.append(" ".join(rng.choices(WORDS, k=k)))
+                    n_lines += 1
+
+            if len(buf) >= 10000:
+                f.write("\n".join(buf) + "\n")
+                buf.clear()
+        if buf:
+            f.write("\n".join(buf) + "\n")
+    return n_msgs
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("out")
+    ap.add_argument("--lines", type=int, default=100_000)
+    ap.add_argument("--authors", type=int, default=5)
+    ap.add_argument("--format", choices=FORMAT_NAMES, default="us_12h")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    n = write_export(args.out, args.lines, args.authors, args.format, args.seed)
+    print(f"wrote {args.lines:,} lines ({n:,} messages) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
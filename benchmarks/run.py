@@ -0,0 +1,195 @@
+"""Scaling benchmarks for parsing, every stats function, rendering and main.
+
+Run from the repository root:
+
+    python -m benchmarks.run [--lines 10000 100000 1000000] [--save out.json]
+                             [--baseline base.json] [--only parse,basic_stats]
+
+Exports are generated once per size with benchmarks.generate and kept in
+``--data-dir``. Each benchmark reports the best of ``--repeat`` runs.
+``--save`` writes the results as JSON. ``--baseline`` compares against a
+saved file and exits non-zero if any benchmark is slower than
+``--threshold``.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Tuple
+
+import chat_models
+import chat_stats
+from analyze_chat import main as analyze_main
+from chat_cube import build_cube
+from chat_parser import parse_chat
+from chat_report import author_html
+from chat_sentiment import score_sentiment
+
+from benchmarks.generate import write_export
+
+STATS_FUNCS = (
+    "basic_stats",
+    "daily_activity",
+    "word_frequencies",
+    "sentiment_scores",
+    "confrontational_index",
+    "pos_stats",
+    "words_not_to_say",
+)
+
+
+def export_for(data_dir: str, lines: int, authors: int, seed: int) -> str:
+    path = os.path.join(data_dir, f"export_{lines}_{authors}_{seed}.txt")
+    if not os.path.exists(path):
+        tmp = f"{path}.tmp"
+        write_export(tmp, lines, authors=authors, seed=seed)
+        os.replace(tmp, path)
+    return path
+
+
+def best_of(func: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def render_all(msgs) -> None:
+    stats = chat_stats.basic_stats(msgs)
+    daily = chat_stats.daily_activity(msgs)
+    for author, st in stats.items():
+        author_html(
+            author, st, daily.get(author, {}), {}, {}, 0.0, {}, [],
+            st["Hourly activity"],
+        )
+
+
+def run_main(path: str) -> None:
+    with tempfile.TemporaryDirectory() as out, \
+            contextlib.redirect_stdout(io.StringIO()):
+        analyze_main([path, "--out", out, "--no-cache"])
+
+
+def benchmarks_for(path: str) -> List[Tuple[str, Callable[[], object]]]:
+    msgs = parse_chat(path)
+    benches = [("parse_chat", lambda: parse_chat(path))]
+    for name in STATS_FUNCS:
+        benches.append((name, lambda f=getattr(chat_stats, name): f(msgs)))
+    benches.append((
+        "word_frequencies(approx=1000)",
+        lambda: chat_stats.word_frequencies(msgs, approx=1000),
+    ))
+    sentiment = score_sentiment(msgs)
+    benches.append(("build_cube", lambda: build_cube(msgs, sentiment)))
+    benches.append(("author_html", lambda: render_all(msgs)))
+    benches.append(("analyze_chat.main", lambda: run_main(path)))
+    return benches
+
+
+def git_revision() -> str:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+    return out.stdout.strip()
+
+
+def compare(
+    results: Dict[str, dict], baseline: Dict[str, dict], threshold: float
+) -> List[str]:
+    """Print current vs baseline times; return keys that regressed."""
+    regressed = []
+    print(f"\n{'benchmark':<36} {'base':>9} {'now':>9} {'ratio':>7}")
+    for key, r in results.items():
+        base = baseline.get(key)
+        if base is None:
+            continue
+        ratio = r["seconds"] / base["seconds"] if base["seconds"] else 1.0
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            regressed.append(key)
+        print(
+            f"{key:<36} {base['seconds']:>9.3f} {r['seconds']:>9.3f} "
+            f"{ratio:>6.2f}x{flag}"
+        )
+    return regressed
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--lines", type=int, nargs="+", default=[10_000, 100_000])
+    ap.add_argument("--authors", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--only", default="", help="comma-separated benchmark names")
+    ap.add_argument(
+        "--data-dir",
+        default=os.path.join(tempfile.gettempdir(), "whatsappbot-bench"),
+    )
+    ap.add_argument("--save", help="write results to this JSON file")
+    ap.add_argument("--baseline", help="compare against a saved JSON file")
+    ap.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="fractional slowdown that counts as a regression",
+    )
+    args = ap.parse_args()
+    only = {s for s in args.only.split(",") if s}
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    chat_models.preload()
+
+    results: Dict[str, dict] = {}
+    print(f"{'benchmark':<36} {'seconds':>9} {'lines/s':>12}")
+    for lines in args.lines:
+        path = export_for(args.data_dir, lines, args.authors, args.seed)
+        for name, func in benchmarks_for(path):
+            if only and name not in only:
+                continue
+            secs = best_of(func, args.repeat)
+            key = f"{name}@{lines}"
+            results[key] = {"name": name, "lines": lines, "seconds": round(secs, 6)}
+            print(f"{key:<36} {secs:>9.3f} {lines / secs:>12,.0f}")
+
+    report = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "authors": args.authors,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w", encoding="utf8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf8") as f:
+            baseline = json.load(f)["results"]
+        regressed = compare(results, baseline, args.threshold)
+        if regressed:
+            print(f"\n{len(regressed)} benchmark(s) slower than baseline "
+                  f"by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+# chat_batch.py
+"""Analyse many exports in one run.
+
+    python chat_batch.py exports/ more/*.txt --out reports -j 8
+
+Every export gets its own report directory under ``--out``, named after
+the file. ``summary.json`` and ``index.html`` there list each chat's
+status, message count and timing. A chat that fails, or runs past
+``--timeout`` seconds, is recorded as such and the rest carry on.
+"""
+import argparse
+import glob
+import json
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import chat_models
+from analyze_chat import analyze, report_filename
+from chat_files import atomic_open
+from chat_report import batch_index_html, write_html
+
+SUMMARY_FILE = "summary.json"
+
+
+class ChatTimeout(Exception):
+    pass
+
+
+def find_exports(patterns: List[str]) -> List[str]:
+    """Expand directories (their ``*.txt`` files) and glob patterns."""
+    paths: List[str] = []
+    seen = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "*.txt"))
+        else:
+            matches = glob.glob(pattern, recursive=True)
+        for p in sorted(matches):
+            key = os.path.realpath(p)
+            if os.path.isfile(p) and key not in seen:
+                seen.add(key)
+                paths.append(p)
+    return paths
+
+
+def report_dirs(paths: List[str]) -> Dict[str, str]:
+    """A distinct report directory name for each export."""
+    names: Dict[str, str] = {}
+    used = set()
+    for p in paths:
+        stem = Path(p).stem or "chat"
+        name, n = stem, 1
+        while name in used:
+            n += 1
+            name = f"{stem}-{n}"
+        used.add(name)
+        names[p] = name
+    return names
+
+
+def _on_alarm(signum, frame):
+    raise ChatTimeout()
+
+
+def analyze_one(
+    path: str, out_dir: str, timeout: Optional[int], options: dict
+) -> dict:
+    """Analyse one export; never raises, the outcome is in the entry.
+
+    Caches go in ``out_dir`` rather than beside the export, which may be
+    read-only.
+    """
+    entry = {"chat": path, "dir": os.path.basename(out_dir), "status": "ok"}
+    use_alarm = bool(timeout) and hasattr(signal, "SIGALRM")
+    start = time.perf_counter()
+    try:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, _on_alarm)
+            signal.alarm(timeout)
+        results = analyze(
+            path, out_dir, verbose=False, cache_dir=out_dir, **options
+        )
+    except ChatTimeout:
+        entry["status"] = "timeout"
+        entry["error"] = f"took longer than {timeout}s"
+        results = None
+    except Exception as e:
+        entry["status"] = "failed"
+        entry["error"] = f"{type(e).__name__}: {e}"
+        results = None
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+    entry["seconds"] = round(time.perf_counter() - start, 3)
+
+    if results is not None:
+        basic = results["basic"]
+        entry["messages"] = int(sum(s["Total messages"] for s in basic.values()))
+        if options.get("dashboard"):
+            entry["reports"] = {"dashboard": "index.html"}
+        else:
+            entry["reports"] = {a: report_filename(a) for a in basic}
+    elif entry["status"] == "ok":
+        entry["status"] = "empty"
+    return entry
+
+
+def run_batch(
+    paths: List[str],
+    out_root: str,
+    workers: int = 1,
+    timeout: Optional[int] = None,
+    progress=None,
+    **options,
+) -> List[dict]:
+    """Analyse ``paths`` into ``out_root`` and write the summary index.
+
+    ``options`` are passed to analyze_chat.analyze. Returns one entry per
+    export, in input order.
+    """
+    Path(out_root).mkdir(parents=True, exist_ok=True)
+    dirs = {p: os.path.join(out_root, d) for p, d in report_dirs(paths).items()}
+    entries: Dict[str, dict] = {}
+    start = time.perf_counter()
+
+    def record(entry):
+        entries[entry["chat"]] = entry
+        if progress:
+            progress(len(entries), len(paths), entry)
+
+    if workers <= 1:
+        chat_models.preload()
+        for p in paths:
+            record(analyze_one(p, dirs[p], timeout, options))
+    else:
+        broken = []
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=chat_models.preload
+        ) as pool:
+            futures = {
+                pool.submit(analyze_one, p, dirs[p], timeout, options): p
+                for p in paths
+            }
+            for fut in as_completed(futures):
+                try:
+                    record(fut.result())
+                except BrokenProcessPool:
+                    broken.append(futures[fut])
+
+        # a worker that died outright took the pool down with it; rerun
+        # what was left one chat at a time to find the one responsible
+        pool = None
+        for p in sorted(broken, key=paths.index):
+            if pool is None:
+                pool = ProcessPoolExecutor(1, initializer=chat_models.preload)
+            fut = pool.submit(analyze_one, p, dirs[p], timeout, options)
+            try:
+                record(fut.result())
+            except BrokenProcessPool:
+                pool.shutdown()
+                pool = None
+                record({
+                    "chat": p,
+                    "dir": os.path.basename(dirs[p]),
+                    "status": "failed",
+                    "error": "worker process died",
+                    "seconds": 0.0,
+                })
+        if pool is not None:
+            pool.shutdown()
+
+    ordered = [entries[p] for p in paths]
+    total = round(time.perf_counter() - start, 3)
+    summary = os.path.join(out_root, SUMMARY_FILE)
+    with atomic_open(summary, "w", encoding="utf8") as f:
+        json.dump({"seconds": total, "chats": ordered}, f, indent=2)
+    write_html(
+        os.path.join(out_root, "index.html"), batch_index_html(ordered, total)
+    )
+    return ordered
+
+
+def _print_progress(done: int, total: int, entry: dict) -> None:
+    line = f"[{done}/{total}] {entry['status']:<7} {entry['seconds']:7.2f}s {entry['chat']}"
+    if "error" in entry:
+        line += f" ({entry['error']})"
+    print(line)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        description="Write HTML reports for every WhatsApp export in a "
+        "directory or glob."
+    )
+    ap.add_argument("exports", nargs="+", help="export files, directories or globs")
+    ap.add_argument("--out", default="chat_reports", help="root report directory")
+    ap.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of chats analysed at once",
+    )
+    ap.add_argument(
+        "--timeout",
+        type=int,
+        default=None,
+        help="give up on a chat after this many seconds (Unix only)",
+    )
+    ap.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse exports without reading or writing the parse caches "
+        "and rollup cubes kept in each chat's report directory",
+    )
+    ap.add_argument(
+        "--fast-pos",
+        action="store_true",
+        help="tag each word type once instead of every token (approximate)",
+    )
+    ap.add_argument("--pos-cache", default=None, help="word->tag cache for --fast-pos")
+    ap.add_argument(
+        "--dashboard",
+        action="store_true",
+        help="write one dashboard per chat instead of a file per author",
+    )
+    ap.add_argument(
+        "--approx-words",
+        type=int,
+        default=None,
+        metavar="N",
+        help="keep at most N candidate words per author, in O(authors x N) "
+        "memory (approximate counts)",
+    )
+    args = ap.parse_args(argv)
+    if args.approx_words is not None and args.approx_words < 1:
+        ap.error("--approx-words must be at least 1")
+
+    paths = find_exports(args.exports)
+    if not paths:
+        print("No exports found.")
+        return
+
+    entries = run_batch(
+        paths,
+        args.out,
+        workers=args.workers,
+        timeout=args.timeout,
+        progress=_print_progress,
+        use_cache=not args.no_cache,
+        fast_pos=args.fast_pos,
+        pos_cache=args.pos_cache,
+        dashboard=args.dashboard,
+        approx_words=args.approx_words,
+    )
+    ok = sum(e["status"] == "ok" for e in entries)
+    print(f"{ok}/{len(entries)} chats analysed; index at {os.path.join(args.out, 'index.html')}")
+
+
+if __name__ == "__main__":
+    main()
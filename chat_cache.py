@@ -0,0 +1,108 @@
+# chat_cache.py
+import hashlib
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+import chat_profile
+from chat_files import atomic_open, export_key, json_bytes
+from chat_table import MessageTable, load_table
+
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".cache.npz"
+
+
+def cache_path_for(path: str) -> str:
+    return f"{path}{CACHE_SUFFIX}"
+
+
+def content_hash(path: str, block: int = 1 << 20) -> str:
+    h = hashlib.sha1()
+    with chat_profile.span("hash export"), open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def save_cache(cache_path: str, table: MessageTable, key: dict) -> None:
+    meta = dict(key, version=CACHE_VERSION, chat_format=table.chat_format)
+    with atomic_open(cache_path) as f:
+        np.savez(
+            f,
+            meta=json_bytes(meta),
+            authors=json_bytes(table.authors),
+            ts=table.ts,
+            author_ids=table.author_ids,
+            n_words=table.n_words,
+            text_offsets=table.text_offsets,
+            text_buf=np.frombuffer(table.text_buf, dtype=np.uint8),
+        )
+
+
+def _read_meta(cache_path: str) -> Optional[dict]:
+    try:
+        with np.load(cache_path, allow_pickle=False) as z:
+            meta = json.loads(z["meta"].tobytes())
+    except (OSError, ValueError, KeyError):
+        return None
+    return meta if meta.get("version") == CACHE_VERSION else None
+
+
+def _read_table(cache_path: str, meta: dict) -> MessageTable:
+    with chat_profile.span("read cache") as sp, \
+            np.load(cache_path, allow_pickle=False) as z:
+        sp.count(len(z["ts"]))
+        return MessageTable(
+            ts=z["ts"],
+            author_ids=z["author_ids"],
+            authors=json.loads(z["authors"].tobytes()),
+            text_buf=z["text_buf"].tobytes(),
+            text_offsets=z["text_offsets"],
+            n_words=z["n_words"],
+            chat_format=meta["chat_format"],
+        )
+
+
+def invalidate_cache(path: str) -> None:
+    try:
+        os.remove(cache_path_for(path))
+    except FileNotFoundError:
+        pass
+
+
+def load_cached_table(
+    path: str,
+    refresh: bool = False,
+    workers: Optional[int] = None,
+    cache_path: Optional[str] = None,
+) -> MessageTable:
+    """Load ``path`` as a MessageTable through a binary cache.
+
+    The cache lives beside the export unless ``cache_path`` says
+    otherwise. It is reused when the export's size and mtime match. When
+    only the mtime differs, the content hash decides. ``refresh=True``
+    reparses and rewrites the cache regardless.
+    """
+    if cache_path is None:
+        cache_path = cache_path_for(path)
+    key = export_key(path)
+
+    meta = None if refresh else _read_meta(cache_path)
+    digest = None
+    if meta is not None and meta["size"] == key["size"]:
+        if meta["mtime_ns"] == key["mtime_ns"]:
+            return _read_table(cache_path, meta)
+        digest = content_hash(path)
+        if meta["sha1"] == digest:
+            table = _read_table(cache_path, meta)
+            # touched but unchanged: record the new mtime for next time
+            save_cache(cache_path, table, dict(key, sha1=digest))
+            return table
+
+    if digest is None:
+        digest = content_hash(path)
+    table = load_table(path, workers=workers)
+    save_cache(cache_path, table, dict(key, sha1=digest))
+    return table
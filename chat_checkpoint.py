@@ -0,0 +1,275 @@
+# chat_checkpoint.py
+import dataclasses
+import hashlib
+import os
+import pickle
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import timedelta
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+import chat_models
+from chat_files import atomic_open
+from chat_parser import (
+    ChatFormat,
+    Message,
+    detect_chat_format,
+    is_message_header,
+    iter_range,
+    last_message_starts,
+)
+from chat_cube import RollupCube, build_cube, cube_from_bytes, cube_to_bytes
+from chat_sentiment import SentimentScores, score_sentiment
+from chat_sessions import SessionCounts, session_stats
+from chat_stats import (
+    BasicStatsEngine,
+    accumulate_confront,
+    accumulate_daily,
+    accumulate_heatmap,
+    accumulate_sentiment,
+    bad_words_result,
+    confront_result,
+    heatmap_result,
+    pos_top,
+    sentiment_result,
+)
+from chat_table import EPOCH
+from chat_tokens import tokenize_corpus
+
+CHECKPOINT_VERSION = 4
+# bytes hashed per read when fingerprinting the folded prefix
+_HASH_CHUNK = 1 << 20
+
+
+class ChatAggregates:
+    """Mergeable state behind every analyze_chat stage.
+
+    ``fold`` takes messages in export order and can be called repeatedly;
+    ``results`` renders the same dicts the chat_stats functions return.
+    Only running totals and histograms are kept, never per-message data,
+    so the state grows with authors, days, vocabulary and distinct gaps
+    rather than with the chat. Everything is exact except ``pos``, whose
+    tags are assigned per folded batch rather than over each author's
+    whole token stream, and ``bad_words``, whose high-frequency words are
+    the top 100 as of each batch rather than of the whole chat.
+    """
+
+    def __init__(self):
+        self.basic = BasicStatsEngine()
+        self.daily = defaultdict(partial(defaultdict, int))
+        self.heatmap: Dict[str, Counter] = defaultdict(Counter)
+        self.sessions = SessionCounts()
+        self.cube: Optional[RollupCube] = None
+        self.words: Dict[str, Counter] = defaultdict(Counter)
+        self.sent_sums = defaultdict(partial(defaultdict, float))
+        self.sent_counts = defaultdict(int)
+        self.confront_sums = defaultdict(float)
+        self.confront_counts = defaultdict(int)
+        # counts behind the top-100 set left out of pos / bad words
+        self.nonstop_counts = Counter()
+        self.word_scores = defaultdict(partial(defaultdict, float))
+        self.pos_pairs: Dict[str, Counter] = defaultdict(Counter)
+
+    def fold(self, msgs: List[Message], sentiment: SentimentScores) -> None:
+        for m in msgs:
+            self.basic.feed(m)
+        accumulate_daily(self.daily, msgs)
+        accumulate_heatmap(self.heatmap, msgs)
+        for m in msgs:
+            self.sessions.feed((m.ts - EPOCH) // timedelta(seconds=1), m.author)
+        batch_cube = build_cube(msgs, sentiment)
+        self.cube = RollupCube.concat(
+            [self.cube, batch_cube] if self.cube is not None else [batch_cube]
+        )
+        accumulate_sentiment(
+            self.sent_sums, self.sent_counts, msgs, sentiment
+        )
+        accumulate_confront(
+            self.confront_sums, self.confront_counts, msgs, sentiment
+        )
+
+        corpus = tokenize_corpus(msgs)
+        negative: List[Tuple[str, float, List[str]]] = []
+        by_author_tokens = defaultdict(list)
+        for i, m in enumerate(msgs):
+            self.words[m.author].update(corpus.words(i))
+            nonstop = corpus.nonstop_words(i)
+            self.nonstop_counts.update(nonstop)
+
+            txt = m.text.strip()
+            if not txt:
+                continue
+            vs = sentiment.polarity(txt)
+            neg_score = max(vs["neg"], -vs["compound"])
+            if neg_score > 0:
+                negative.append((m.author, neg_score, nonstop))
+            by_author_tokens[m.author].extend(corpus.pos_words(i))
+
+        high = self._high()
+        for author, neg_score, words in negative:
+            words = [w for w in words if w not in high]
+            if not words:
+                continue
+            per_word = neg_score / len(words)
+            for w in words:
+                self.word_scores[author][w] += per_word
+
+        for author, tokens in by_author_tokens.items():
+            self.pos_pairs[author].update(chat_models.tagger().tag(tokens))
+
+    def __getstate__(self):
+        # the cube is mostly zeros; compressed it is a fraction of the size
+        state = dict(self.__dict__)
+        if self.cube is not None:
+            state["cube"] = cube_to_bytes(self.cube)
+        return state
+
+    def __setstate__(self, state):
+        if isinstance(state.get("cube"), bytes):
+            state["cube"] = cube_from_bytes(state["cube"])
+        self.__dict__.update(state)
+
+    def _high(self):
+        return {w for w, _ in self.nonstop_counts.most_common(100)}
+
+    def results(
+        self, top_k: int = 10, min_total: float = 0.5
+    ) -> Dict[str, object]:
+        high = self._high()
+        return {
+            "basic": self.basic.result(),
+            "daily": self.daily,
+            "heatmap": heatmap_result(self.heatmap),
+            "sessions": session_stats(None, self.sessions),
+            "words": self.words,
+            "sentiment": sentiment_result(self.sent_sums, self.sent_counts),
+            "confront": confront_result(
+                self.confront_sums, self.confront_counts
+            ),
+            "pos": {
+                author: pos_top(
+                    ((p, c) for p, c in pairs.items() if p[0] not in high),
+                    top_k,
+                )
+                for author, pairs in self.pos_pairs.items()
+            },
+            "bad_words": bad_words_result(self.word_scores, min_total),
+            "cube": self.cube,
+        }
+
+
+@dataclass
+class Checkpoint:
+    """Aggregates of every message before ``offset``.
+
+    The last message of an export is never folded in: a later export may
+    have appended continuation lines to it. It is re-parsed from
+    ``offset`` next time. ``prefix_hash`` fingerprints every folded byte,
+    ``[0, offset)``, so an edit anywhere before ``offset`` is caught.
+    """
+
+    version: int
+    chat_format: str
+    offset: int
+    prefix_hash: str
+    aggregates: ChatAggregates
+
+
+def _hash_range(path: str, start: int, end: int, h=None):
+    """``h`` (a new sha1 by default) updated with bytes [start, end)."""
+    if h is None:
+        h = hashlib.sha1()
+    with open(path, "rb") as f:
+        f.seek(start)
+        left = end - start
+        while left > 0:
+            chunk = f.read(min(_HASH_CHUNK, left))
+            if not chunk:
+                break
+            h.update(chunk)
+            left -= len(chunk)
+    return h
+
+
+def load_checkpoint(path: str) -> Optional[Checkpoint]:
+    try:
+        with open(path, "rb") as f:
+            ckpt = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+    if getattr(ckpt, "version", None) != CHECKPOINT_VERSION:
+        return None
+    return ckpt
+
+
+def save_checkpoint(path: str, ckpt: Checkpoint) -> None:
+    with atomic_open(path) as f:
+        pickle.dump(ckpt, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _prefix_hash(path: str, ckpt: Checkpoint, fmt: ChatFormat):
+    """The hash of ``path`` up to ``ckpt.offset`` if it still matches."""
+    if ckpt.chat_format != fmt.name or os.path.getsize(path) <= ckpt.offset:
+        return None
+    with open(path, "rb") as f:
+        f.seek(ckpt.offset)
+        head = f.readline()
+    if not is_message_header(head.rstrip(b"\n"), fmt):
+        return None
+    h = _hash_range(path, 0, ckpt.offset)
+    return h if h.hexdigest() == ckpt.prefix_hash else None
+
+
+def update_checkpoint(
+    chat_path: str,
+    checkpoint_path: str,
+    sentiment_cache: Optional[str] = None,
+) -> Tuple[Optional[Dict[str, object]], bool]:
+    """Fold the unseen tail of ``chat_path`` into its checkpoint.
+
+    Returns the stage results and whether the run was incremental. A
+    missing, stale or mismatching checkpoint triggers a full rebuild;
+    results are None when the export holds no messages. Raises
+    ValueError if the export is not in chronological order.
+    """
+    fmt = detect_chat_format(chat_path)
+    ckpt = load_checkpoint(checkpoint_path)
+    prefix = None if ckpt is None else _prefix_hash(chat_path, ckpt, fmt)
+    incremental = prefix is not None
+
+    if incremental:
+        start, agg = ckpt.offset, ckpt.aggregates
+    else:
+        start, agg, prefix = 0, ChatAggregates(), hashlib.sha1()
+
+    size = os.path.getsize(chat_path)
+    msgs = list(iter_range(chat_path, start, size, fmt))
+    if not msgs:
+        return None, incremental
+
+    sentiment = score_sentiment(msgs, cache_path=sentiment_cache)
+    try:
+        agg.fold(
+            msgs[:-1], dataclasses.replace(sentiment, rows=sentiment.rows[:-1])
+        )
+    except ValueError:
+        if not incremental:
+            raise
+        # the new tail goes back in time: the prefix was rewritten
+        os.remove(checkpoint_path)
+        return update_checkpoint(chat_path, checkpoint_path, sentiment_cache)
+
+    offset = ([0] + last_message_starts(chat_path, 1, fmt))[-1]
+    save_checkpoint(checkpoint_path, Checkpoint(
+        version=CHECKPOINT_VERSION,
+        chat_format=fmt.name,
+        offset=offset,
+        prefix_hash=_hash_range(chat_path, start, offset, prefix).hexdigest(),
+        aggregates=agg,
+    ))
+
+    agg.fold(
+        msgs[-1:], dataclasses.replace(sentiment, rows=sentiment.rows[-1:])
+    )
+    return agg.results(), incremental
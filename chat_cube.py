@@ -0,0 +1,411 @@
+# chat_cube.py
+"""Author x day x hour rollups of an export, for instant range reports.
+
+Each message is counted once into per-(author, day) rows of 24 hourly
+cells: messages, words, and the VADER sums behind sentiment_scores.
+Only days an author wrote on get a row, so the cube grows with activity
+rather than with authors x days. Rows are sorted by day, so a date
+window is a contiguous slice of rows, and its totals, daily series,
+hourly profile, weekday x hour heatmap and sentiment are sums over that
+slice. The cube is saved beside the export as ``CHAT.cube.npz``:
+
+    python chat_cube.py chat.txt --range 2024-03-01 2024-03-31
+"""
+import argparse
+import io
+import json
+from collections import defaultdict
+from datetime import date, timedelta
+from functools import partial
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from chat_files import atomic_open, export_key, json_bytes
+from chat_sentiment import SentimentScores
+from chat_stats import sentiment_result
+from chat_table import EPOCH, MessageTable
+
+CUBE_VERSION = 3
+CUBE_SUFFIX = ".cube.npz"
+
+# arrays of shape (rows, 24); the first three count, the rest sum
+_FIELDS = ("counts", "words", "scored", "pos", "neg", "compound")
+
+
+class RollupCube:
+    """Per-author, per-day, per-hour sums, stored as sparse rows.
+
+    Row ``r`` holds author ``row_author[r]`` on day ``row_day[r]`` (days
+    since 1970-01-01); rows are sorted by day, then author. ``counts``
+    and ``words`` cover every message; ``scored`` counts the messages
+    with non-blank text and ``pos``/``neg``/``compound`` sum their VADER
+    scores, as sentiment_scores does. The cube spans ``n_days`` days
+    from ``day0``, whether or not each has rows.
+    """
+
+    def __init__(
+        self,
+        authors: List[str],
+        day0: int,
+        n_days: int,
+        row_author: np.ndarray,
+        row_day: np.ndarray,
+        counts: np.ndarray,
+        words: np.ndarray,
+        scored: np.ndarray,
+        pos: np.ndarray,
+        neg: np.ndarray,
+        compound: np.ndarray,
+    ):
+        self.authors = authors
+        self.day0 = day0
+        self.n_days = n_days
+        self.row_author = row_author
+        self.row_day = row_day
+        self.counts = counts
+        self.words = words
+        self.scored = scored
+        self.pos = pos
+        self.neg = neg
+        self.compound = compound
+
+    @classmethod
+    def concat(cls, cubes: List["RollupCube"]) -> "RollupCube":
+        """One cube over the messages of all ``cubes``.
+
+        Authors are matched by name; rows for the same (author, day), as
+        when two batches share a day, are summed.
+        """
+        cubes = [c for c in cubes if c.n_days]
+        if not cubes:
+            return build_cube([])
+        index: Dict[str, int] = {}
+        row_author = []
+        for c in cubes:
+            remap = np.array(
+                [index.setdefault(a, len(index)) for a in c.authors],
+                dtype=np.int32,
+            )
+            row_author.append(remap[c.row_author])
+        n_authors = len(index)
+        day0 = min(c.day0 for c in cubes)
+        n_days = max(c.day0 + c.n_days for c in cubes) - day0
+        keys, row_of = np.unique(
+            (np.concatenate([c.row_day for c in cubes]).astype(np.int64) - day0)
+            * n_authors + np.concatenate(row_author),
+            return_inverse=True,
+        )
+        sums = {
+            name: cls._rollup(
+                row_of.ravel(), len(keys),
+                np.concatenate([getattr(c, name) for c in cubes]),
+                getattr(cubes[0], name).dtype,
+            )
+            for name in _FIELDS
+        }
+        return cls(
+            list(index),
+            day0,
+            n_days,
+            row_author=(keys % n_authors).astype(np.int32),
+            row_day=(keys // n_authors + day0).astype(np.int32),
+            **sums,
+        )
+
+    def day(self, k: int) -> date:
+        return EPOCH.date() + timedelta(days=self.day0 + k)
+
+    def window(
+        self, first: Optional[date] = None, last: Optional[date] = None
+    ) -> "RollupCube":
+        """The cube restricted to ``first``..``last`` inclusive (views)."""
+        epoch = EPOCH.date()
+        lo = 0 if first is None else (first - epoch).days - self.day0
+        hi = self.n_days if last is None else (last - epoch).days - self.day0 + 1
+        lo = min(max(lo, 0), self.n_days)
+        hi = min(max(hi, lo), self.n_days)
+        r0, r1 = np.searchsorted(self.row_day, [self.day0 + lo, self.day0 + hi])
+        return RollupCube(
+            self.authors,
+            self.day0 + lo,
+            hi - lo,
+            *(getattr(self, f)[r0:r1] for f in ("row_author", "row_day")),
+            *(getattr(self, f)[r0:r1] for f in _FIELDS),
+        )
+
+    def _per_author(self, values: np.ndarray, dtype=np.int64) -> np.ndarray:
+        """Sums of ``values`` (one entry or hour row per row) by author."""
+        return self._rollup(self.row_author, len(self.authors), values, dtype)
+
+    @staticmethod
+    def _rollup(keys, n_keys, values, dtype):
+        width = values.shape[1] if values.ndim > 1 else 1
+        cells = (keys[:, None] * width + np.arange(width)).ravel()
+        sums = np.bincount(
+            cells, weights=values.ravel(), minlength=n_keys * width
+        )
+        return sums.astype(dtype).reshape((n_keys,) + values.shape[1:])
+
+    def _active(self) -> List[int]:
+        return np.flatnonzero(
+            np.bincount(self.row_author, minlength=len(self.authors))
+        ).tolist()
+
+    def hourly(self) -> np.ndarray:
+        """Messages per author and hour of day, shape (authors, 24)."""
+        return self._per_author(self.counts)
+
+    def weekday_hour(self) -> np.ndarray:
+        """Messages per author, weekday (Monday first) and hour."""
+        # 1970-01-01 was a Thursday
+        weekdays = (self.row_day + 3) % 7
+        sums = self._rollup(
+            self.row_author * 7 + weekdays, len(self.authors) * 7,
+            self.counts, np.int64,
+        )
+        return sums.reshape(len(self.authors), 7, 24)
+
+    def daily_activity(self) -> Dict[str, Dict[str, int]]:
+        """Same shape and order as chat_stats.daily_activity."""
+        order = np.lexsort((self.row_day, self.row_author))
+        days = [self.day(k).isoformat() for k in range(self.n_days)]
+        by: Dict[str, Dict[str, int]] = defaultdict(partial(defaultdict, int))
+        for a, k, n in zip(
+            self.row_author[order].tolist(),
+            (self.row_day[order] - self.day0).tolist(),
+            self.counts[order].sum(axis=1).tolist(),
+        ):
+            by[self.authors[a]][days[k]] = n
+        return by
+
+    def heatmaps(self) -> Dict[str, List[List[int]]]:
+        """Weekday x hour message counts per active author."""
+        grid = self.weekday_hour()
+        return {self.authors[a]: grid[a].tolist() for a in self._active()}
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """The basic_stats entries that only need counts, per active author."""
+        hours = self.hourly()
+        counts = hours.sum(axis=1)
+        words = self._per_author(self.words.sum(axis=1))
+        out: Dict[str, Dict[str, float]] = {}
+        for a in self._active():
+            n = int(counts[a])
+            hour_counts = hours[a].tolist()
+            out[self.authors[a]] = {
+                "Total messages": float(n),
+                "Average words per message": round(int(words[a]) / n, 2),
+                "Peak message hour": float(hour_counts.index(max(hour_counts))),
+                "Hourly activity": [round(c / n, 3) for c in hour_counts],
+            }
+        return out
+
+    def sentiment(self) -> Dict[str, Dict[str, float]]:
+        """Same result as chat_stats.sentiment_scores over the window."""
+        scored = self._per_author(self.scored.sum(axis=1))
+
+        def total(field: np.ndarray) -> np.ndarray:
+            return self._per_author(field.sum(axis=1), np.float64)
+
+        pos, neg, compound = total(self.pos), total(self.neg), total(self.compound)
+        sums, counts = {}, {}
+        for a in np.flatnonzero(scored).tolist():
+            author = self.authors[a]
+            sums[author] = {
+                "Happiness": float(pos[a]),
+                "Sadness": float(neg[a]),
+                "Anger": float(neg[a]),
+                "Overall": float(compound[a]),
+            }
+            counts[author] = int(scored[a])
+        return sentiment_result(sums, counts)
+
+
+def build_cube(
+    msgs, sentiment: Optional[SentimentScores] = None
+) -> RollupCube:
+    """Roll ``msgs`` (a list or MessageTable) up into a RollupCube."""
+    if sentiment is None:
+        sentiment = SentimentScores()
+    table = msgs if getattr(msgs, "columnar", False) else (
+        MessageTable.from_messages(msgs)
+    )
+    n_authors = len(table.authors)
+    n = len(table)
+
+    days = table.day_index()
+    day0 = int(days.min()) if n else 0
+    n_days = int(days.max()) - day0 + 1 if n else 0
+    # one row per (day, author) that has messages, sorted by day
+    keys, row_of = np.unique(
+        (days - day0) * n_authors + table.author_ids, return_inverse=True
+    )
+    cells = row_of.ravel() * 24 + table.hour_of_day()
+    size = len(keys) * 24
+    shape = (len(keys), 24)
+
+    scores = sentiment.row_scores(table)
+    scored = ~np.isnan(scores[:, 0])
+    scores = np.where(scored[:, None], scores, 0.0).T
+
+    def rollup(weights=None, dtype=np.int32):
+        sums = np.bincount(cells, weights=weights, minlength=size)
+        return sums.astype(dtype).reshape(shape)
+
+    return RollupCube(
+        list(table.authors),
+        day0,
+        n_days,
+        row_author=(keys % max(n_authors, 1)).astype(np.int32),
+        row_day=(keys // max(n_authors, 1) + day0).astype(np.int32),
+        counts=rollup(),
+        words=rollup(table.n_words),
+        scored=rollup(scored),
+        pos=rollup(scores[0], np.float64),
+        neg=rollup(scores[1], np.float64),
+        compound=rollup(scores[2], np.float64),
+    )
+
+
+def daily_from_cube(msgs, cube: RollupCube) -> Dict[str, Dict[str, int]]:
+    return cube.daily_activity()
+
+
+def heatmaps_from_cube(msgs, cube: RollupCube) -> Dict[str, List[List[int]]]:
+    return cube.heatmaps()
+
+
+def cube_path_for(path: str) -> str:
+    return f"{path}{CUBE_SUFFIX}"
+
+
+def _write_cube(f, cube: RollupCube, key: dict) -> None:
+    meta = dict(key, version=CUBE_VERSION, day0=cube.day0, n_days=cube.n_days)
+    # mostly zeros, so compression pays for itself
+    np.savez_compressed(
+        f,
+        meta=json_bytes(meta),
+        authors=json_bytes(cube.authors),
+        row_author=cube.row_author,
+        row_day=cube.row_day,
+        **{name: getattr(cube, name) for name in _FIELDS},
+    )
+
+
+def _read_cube(z) -> RollupCube:
+    meta = json.loads(z["meta"].tobytes())
+    return RollupCube(
+        json.loads(z["authors"].tobytes()),
+        meta["day0"],
+        meta["n_days"],
+        row_author=z["row_author"],
+        row_day=z["row_day"],
+        **{name: z[name] for name in _FIELDS},
+    )
+
+
+def save_cube(cube_path: str, cube: RollupCube, key: dict) -> None:
+    with atomic_open(cube_path) as f:
+        _write_cube(f, cube, key)
+
+
+def cube_to_bytes(cube: RollupCube) -> bytes:
+    """``cube`` compressed as in a cube file, to embed in other state."""
+    buf = io.BytesIO()
+    _write_cube(buf, cube, {})
+    return buf.getvalue()
+
+
+def cube_from_bytes(data: bytes) -> RollupCube:
+    with np.load(io.BytesIO(data), allow_pickle=False) as z:
+        return _read_cube(z)
+
+
+def _meta_matches(z, key: Optional[dict]) -> bool:
+    meta = json.loads(z["meta"].tobytes())
+    return meta.get("version") == CUBE_VERSION and all(
+        meta.get(k) == v for k, v in (key or {}).items()
+    )
+
+
+def cube_is_current(cube_path: str, key: dict) -> bool:
+    """Whether ``cube_path`` was built for ``key``, from its meta alone."""
+    try:
+        with np.load(cube_path, allow_pickle=False) as z:
+            return _meta_matches(z, key)
+    except (OSError, ValueError, KeyError):
+        return False
+
+
+def load_cube(cube_path: str, key: Optional[dict] = None) -> Optional[RollupCube]:
+    """The saved cube, or None if missing, outdated or not built for ``key``."""
+    try:
+        with np.load(cube_path, allow_pickle=False) as z:
+            return _read_cube(z) if _meta_matches(z, key) else None
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def load_cached_cube(
+    path: str, refresh: bool = False, sentiment_cache: Optional[str] = None
+) -> RollupCube:
+    """The cube of export ``path``, rebuilt when the export has changed."""
+    cube_path = cube_path_for(path)
+    key = export_key(path)
+    cube = None if refresh else load_cube(cube_path, key)
+    if cube is None:
+        from chat_cache import load_cached_table
+        from chat_sentiment import score_sentiment
+
+        msgs = load_cached_table(path)
+        sentiment = (
+            score_sentiment(msgs, sentiment_cache) if sentiment_cache else None
+        )
+        cube = build_cube(msgs, sentiment)
+        save_cube(cube_path, cube, key)
+    return cube
+
+
+def main(argv=None):
+    from chat_report import WEEKDAYS
+
+    ap = argparse.ArgumentParser(
+        description="Per-author totals for a date range, from the rollup cube."
+    )
+    ap.add_argument("chat")
+    ap.add_argument(
+        "--range", nargs=2, metavar=("FIRST", "LAST"), help="ISO dates, inclusive"
+    )
+    ap.add_argument("--rebuild", action="store_true", help="rebuild the cube")
+    ap.add_argument(
+        "--heatmap", action="store_true", help="also print weekday x hour counts"
+    )
+    args = ap.parse_args(argv)
+
+    cube = load_cached_cube(args.chat, refresh=args.rebuild)
+    if args.range:
+        first, last = (date.fromisoformat(d) for d in args.range)
+        cube = cube.window(first, last)
+    if not cube.n_days:
+        print("No messages in range.")
+        return
+
+    print(f"{cube.day(0)} to {cube.day(cube.n_days - 1)}")
+    sentiment = cube.sentiment()
+    heatmaps = cube.heatmaps() if args.heatmap else {}
+    for author, stats in cube.summary().items():
+        emotions = sentiment.get(author, {})
+        print(
+            f"  {author:<24} {int(stats['Total messages']):>8} msgs"
+            f"  {stats['Average words per message']:>6} words/msg"
+            f"  peak {int(stats['Peak message hour']):02d}:00"
+            f"  happy {emotions.get('Happiness', 0.0):.2f}"
+            f"  sad {emotions.get('Sadness', 0.0):.2f}"
+        )
+        for name, row in zip(WEEKDAYS, heatmaps.get(author, [])):
+            print(f"    {name} " + " ".join(f"{c:>3}" for c in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+# chat_dashboard.py
+"""One shared dashboard instead of an HTML file per author.
+
+Layout of the output directory:
+
+    index.html            shell: markup plus the author list
+    assets/dashboard.css  shared styles
+    assets/dashboard.js   rendering, shared by every author
+    data/NAME.js          one author's results, loaded when selected
+    data/NAME.daily.js    every day, for zooming long histories (optional)
+
+Data files are JSONP so the dashboard also works when opened from disk.
+"""
+import html
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from chat_report import (
+    DAILY_POINT_BUDGET,
+    REPORT_CSS,
+    WEEKDAYS,
+    conversation_rows,
+    daily_data_js,
+    daily_series,
+    write_html,
+)
+
+DASHBOARD_CSS = REPORT_CSS + """\
+    .layout {
+      display: grid;
+      grid-template-columns: 220px minmax(0, 1fr);
+    }
+    nav {
+      position: sticky;
+      top: 0;
+      height: 100vh;
+      overflow-y: auto;
+      background: white;
+      border-right: 1px solid #e5e7eb;
+      padding: 12px 0;
+      font-size: 14px;
+    }
+    nav input {
+      margin: 0 12px 8px;
+      width: calc(100% - 24px);
+      box-sizing: border-box;
+      padding: 4px 8px;
+    }
+    nav a {
+      display: flex;
+      justify-content: space-between;
+      padding: 4px 12px;
+      color: #111827;
+      text-decoration: none;
+    }
+    nav a:hover, nav a.active { background: #eef2ff; }
+    nav a span { color: #6b7280; }
+"""
+
+DASHBOARD_JS = """\
+let current = null;
+let charts = {};
+let daily = null;        // {labels, values, unit, src} of the current author
+let dailyLoaded = null;  // set by the data/NAME.daily.js script
+
+function loadScript(src, onload) {
+  const s = document.createElement('script');
+  s.src = src;
+  if (onload) s.onload = onload;
+  document.head.appendChild(s);
+}
+
+function showAuthor(stem) {
+  current = stem;
+  for (const a of document.querySelectorAll('nav a')) {
+    a.classList.toggle('active', a.dataset.stem === stem);
+  }
+  loadScript('data/' + stem + '.js');
+}
+
+function dailyDataLoaded(d) { dailyLoaded = d; }
+
+function setText(id, text) { document.getElementById(id).textContent = text; }
+
+function fillTable(id, rows) {
+  const table = document.getElementById(id);
+  table.replaceChildren();
+  for (const [cells, head] of rows) {
+    const tr = table.insertRow();
+    cells.forEach((c, i) => {
+      const cell = document.createElement(head && i === 0 ? 'th' : 'td');
+      cell.textContent = c;
+      tr.appendChild(cell);
+    });
+  }
+}
+
+function fillHeatmap(id, grid) {
+  const table = document.getElementById(id);
+  table.replaceChildren();
+  table.parentElement.hidden = !grid.length;
+  const peak = Math.max(1, ...grid.flat());
+  const head = table.insertRow();
+  head.appendChild(document.createElement('th'));
+  for (let h = 0; h < 24; h++) {
+    const th = document.createElement('th');
+    th.textContent = String(h).padStart(2, '0');
+    head.appendChild(th);
+  }
+  grid.forEach((row, w) => {
+    const tr = table.insertRow();
+    const th = document.createElement('th');
+    th.textContent = WEEKDAYS[w];
+    tr.appendChild(th);
+    row.forEach((c, h) => {
+      const td = tr.insertCell();
+      td.title = WEEKDAYS[w] + ' ' + String(h).padStart(2, '0') + ':00: ' + c;
+      td.style.background = 'rgba(79,70,229,' + (c / peak).toFixed(2) + ')';
+    });
+  });
+}
+
+function chart(id, type, labels, data, dataset, options) {
+  if (charts[id]) {
+    charts[id].data.labels = labels;
+    charts[id].data.datasets[0].data = data;
+    Object.assign(charts[id].data.datasets[0], dataset);
+    charts[id].update();
+    return charts[id];
+  }
+  charts[id] = new Chart(document.getElementById(id).getContext('2d'), {
+    type: type,
+    data: { labels: labels, datasets: [Object.assign({ data: data }, dataset)] },
+    options: Object.assign({
+      responsive: true,
+      maintainAspectRatio: false,
+      plugins: { legend: { display: false } },
+    }, options),
+  });
+  return charts[id];
+}
+
+function drawDaily(labels, values, unit) {
+  chart('dailyChart', 'line', labels, values, {
+    label: 'Messages per ' + unit,
+    borderColor: '#4f46e5',
+    backgroundColor: 'rgba(79,70,229,0.12)',
+    borderWidth: 2,
+    tension: 0.25,
+    pointRadius: 2,
+  }, {
+    interaction: { mode: 'index', intersect: false },
+    scales: {
+      x: { ticks: { maxRotation: 45, minRotation: 45, autoSkip: true, maxTicksLimit: 12 } },
+      y: { beginAtZero: true, precision: 0 },
+    },
+    onClick: (evt, points) => {
+      if (!points.length || !daily.src || charts.dailyChart.data.labels !== daily.labels) return;
+      const i = points[0].index;
+      showDays(daily.labels[Math.max(i - 1, 0)], daily.labels[i + 2]);
+    },
+  });
+  document.getElementById('dailyReset').hidden = labels === daily.labels;
+}
+
+function showDays(first, end) {
+  const want = daily;
+  const zoom = () => {
+    if (daily !== want) return;
+    const days = want.full.labels;
+    let lo = days.findIndex(d => d >= first);
+    let hi = end === undefined ? -1 : days.findIndex(d => d >= end);
+    if (lo < 0) lo = days.length;
+    if (hi < 0) hi = days.length;
+    drawDaily(days.slice(lo, hi), want.full.values.slice(lo, hi), 'day');
+  };
+  if (want.full) { zoom(); return; }
+  loadScript('data/' + want.src, () => { want.full = dailyLoaded; zoom(); });
+}
+
+function dashboardData(d) {
+  if (d.stem !== current) return;
+  setText('authorName', d.author);
+  setText('authorLine', 'Most active at ' + d.peak_time + ' | Confrontational index: ' + d.confront);
+  document.title = 'Chat analytics - ' + d.author;
+
+  fillTable('statsTable', d.stats.map(([k, v]) => [[k, v], true]));
+  fillTable('wordsTable', [[['Word', 'Count'], true]].concat(d.top_words.map(r => [r, false])));
+  setText('nouns', d.pos.nouns.join(', '));
+  setText('verbs', d.pos.verbs.join(', '));
+  setText('adjs', d.pos.adjectives.join(', '));
+  setText('badWords', d.bad_words.join(', '));
+
+  daily = d.daily;
+  const totals = { day: '', week: 'Weekly totals', month: 'Monthly totals' }[daily.unit];
+  setText('dailyNote', totals && daily.src ? totals + '; click a point to see its days.' : totals);
+  document.getElementById('dailyAll').hidden = !daily.src;
+  drawDaily(daily.labels, daily.values, daily.unit);
+
+  const hours = [...Array(24).keys()].map(h => String(h).padStart(2, '0') + ':00');
+  chart('hourlyChart', 'bar', hours, d.hourly, {
+    label: 'Normalized activity',
+    backgroundColor: 'rgba(34,197,94,0.6)',
+    borderColor: '#22c55e',
+    borderWidth: 1,
+  }, { scales: { y: { beginAtZero: true, max: 1 } } });
+  fillHeatmap('heatmapTable', d.heatmap);
+  fillTable('conversationTable', d.conversation.map(r => [r, true]));
+  document.getElementById('conversationTable').parentElement.hidden = !d.conversation.length;
+
+  chart('sentChart', 'radar', ['Happiness', 'Sadness', 'Anger', 'Confrontational'], d.emotions, {
+    label: 'Normalised emotion + confrontation',
+    backgroundColor: 'rgba(239,68,68,0.12)',
+    borderColor: '#ef4444',
+    borderWidth: 2,
+    pointBackgroundColor: '#ef4444',
+  }, { scales: { r: { beginAtZero: true, suggestedMax: 1 } } });
+}
+
+document.getElementById('dailyAll').onclick = () => showDays('');
+document.getElementById('dailyReset').onclick = () => drawDaily(daily.labels, daily.values, daily.unit);
+document.getElementById('filter').oninput = (e) => {
+  const q = e.target.value.toLowerCase();
+  for (const a of document.querySelectorAll('nav a')) {
+    a.hidden = !a.dataset.name.toLowerCase().includes(q);
+  }
+};
+window.onhashchange = () => showAuthor(decodeURIComponent(location.hash.slice(1)));
+showAuthor(decodeURIComponent(location.hash.slice(1)) || AUTHORS[0].stem);
+"""
+
+SHELL_HTML = """
+<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="utf-8" />
+  <title>Chat analytics</title>
+  <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
+  <link rel="stylesheet" href="assets/dashboard.css" />
+</head>
+<body>
+  <div class="layout">
+    <nav>
+      <input id="filter" type="search" placeholder="Filter authors" />
+      {nav_links}
+    </nav>
+    <div>
+      <header>
+        <div class="tag">Chat analytics</div>
+        <h1 id="authorName"></h1>
+        <div id="authorLine"></div>
+      </header>
+      <main>
+        <p class="note">
+          POS stats exclude globally high-frequency English words.
+        </p>
+        <div class="grid">
+          <section class="card">
+            <h2>Overview</h2>
+            <table id="statsTable"></table>
+            <p class="small-list">
+              <span class="label">Common nouns:</span> <span id="nouns"></span><br/>
+              <span class="label">Common verbs:</span> <span id="verbs"></span><br/>
+              <span class="label">Common adjectives:</span> <span id="adjs"></span>
+            </p>
+          </section>
+          <section class="card">
+            <h2>Top words</h2>
+            <table id="wordsTable"></table>
+            <p class="small-list">
+              <span class="label">Words not to say:</span> <span id="badWords"></span>
+            </p>
+          </section>
+        </div>
+
+        <section class="grid">
+          <section class="card full-width">
+            <h2>Messages by hour (normalized)</h2>
+            <canvas id="hourlyChart" height="120"></canvas>
+          </section>
+          <section class="card full-width" hidden>
+            <h2>Messages by weekday and hour</h2>
+            <table id="heatmapTable" class="heatmap"></table>
+          </section>
+          <section class="card full-width" hidden>
+            <h2>Conversation</h2>
+            <table id="conversationTable"></table>
+          </section>
+        </section>
+
+        <div class="grid">
+          <section class="card">
+            <h2>Messages over time</h2>
+            <p class="note">
+              <span id="dailyNote"></span>
+              <button id="dailyAll" hidden>All days</button>
+              <button id="dailyReset" hidden>Back</button>
+            </p>
+            <canvas id="dailyChart" height="80"></canvas>
+          </section>
+          <section class="card">
+            <h2>Emotion profile</h2>
+            <canvas id="sentChart" height="120"></canvas>
+          </section>
+        </div>
+      </main>
+    </div>
+  </div>
+  <script>const AUTHORS = {authors_json}; const WEEKDAYS = {weekdays_json};</script>
+  <script src="assets/dashboard.js"></script>
+</body>
+</html>
+"""
+
+
+def author_data(
+    author: str,
+    stem: str,
+    stats: Dict[str, float],
+    daily_counts: Dict[str, int],
+    top_words: Dict[str, int],
+    sentiment: Dict[str, float],
+    confront_score: float,
+    pos_info: Dict[str, list],
+    bad_words: list,
+    daily_src: str = "",
+    heatmap: Optional[List[List[int]]] = None,
+    conversation: Optional[Dict[str, object]] = None,
+) -> dict:
+    """Everything the dashboard shows for one author, as plain JSON."""
+    labels, values, unit = daily_series(daily_counts)
+    peak_hour = int(stats.get("Peak message hour", 0))
+    return {
+        "author": author,
+        "stem": stem,
+        "peak_time": f"{peak_hour:02d}:00",
+        "confront": confront_score,
+        "stats": [
+            [k, v] for k, v in sorted(stats.items()) if k != "Hourly activity"
+        ],
+        "hourly": stats.get("Hourly activity", [0] * 24),
+        "top_words": sorted(top_words.items(), key=lambda x: -x[1])[:10],
+        "emotions": [
+            sentiment.get("Happiness", 0.0),
+            sentiment.get("Sadness", 0.0),
+            sentiment.get("Anger", 0.0),
+            confront_score,
+        ],
+        "pos": {k: pos_info.get(k, []) for k in ("nouns", "verbs", "adjectives")},
+        "bad_words": bad_words[:15],
+        "daily": {"labels": labels, "values": values, "unit": unit, "src": daily_src},
+        "heatmap": heatmap or [],
+        "conversation": conversation_rows(conversation) if conversation else [],
+    }
+
+
+def _jsonp(callback: str, obj) -> str:
+    return f"{callback}({json.dumps(obj, separators=(',', ':'))});\n"
+
+
+def write_dashboard(
+    results: Dict[str, object], out_dir: Path, stems: Dict[str, str]
+) -> List[Path]:
+    """Write the dashboard for ``results`` into ``out_dir``.
+
+    ``stems`` maps each author to a file-safe name. Returns the paths
+    written.
+    """
+    out_dir = Path(out_dir)
+    (out_dir / "assets").mkdir(parents=True, exist_ok=True)
+    (out_dir / "data").mkdir(exist_ok=True)
+    written = []
+
+    stats_by_author = results["basic"]
+    nav = []
+    for author, stats in stats_by_author.items():
+        stem = stems[author]
+        daily_counts = results["daily"].get(author, {})
+        daily_src = ""
+        if len(daily_counts) > DAILY_POINT_BUDGET:
+            daily_src = f"{stem}.daily.js"
+            path = out_dir / "data" / daily_src
+            write_html(path, daily_data_js(daily_counts))
+            written.append(path)
+
+        data = author_data(
+            author,
+            stem,
+            stats,
+            daily_counts,
+            dict(results["words"].get(author, {})),
+            results["sentiment"].get(author, {}),
+            results["confront"].get(author, 0.0),
+            results["pos"].get(author, {}),
+            results["bad_words"].get(author, []),
+            daily_src,
+            results.get("heatmap", {}).get(author),
+            results.get("sessions", {}).get(author),
+        )
+        path = out_dir / "data" / f"{stem}.js"
+        write_html(path, _jsonp("dashboardData", data))
+        written.append(path)
+        nav.append((int(stats.get("Total messages", 0)), author, stem))
+
+    nav.sort(key=lambda x: (-x[0], x[1]))
+    nav_links = "\n      ".join(
+        f'<a href="#{stem}" data-stem="{stem}" data-name="{html.escape(author)}">'
+        f"{html.escape(author)} <span>{count:,}</span></a>"
+        for count, author, stem in nav
+    )
+    authors_json = json.dumps(
+        [{"author": a, "stem": s, "messages": c} for c, a, s in nav]
+    ).replace("</", "<\\/")
+
+    for name, text in (
+        (os.path.join("assets", "dashboard.css"), DASHBOARD_CSS),
+        (os.path.join("assets", "dashboard.js"), DASHBOARD_JS),
+        ("index.html", SHELL_HTML.replace("{nav_links}", nav_links)
+         .replace("{authors_json}", authors_json)
+         .replace("{weekdays_json}", json.dumps(WEEKDAYS))),
+    ):
+        path = out_dir / name
+        write_html(path, text)
+        written.append(path)
+    return written
@@ -0,0 +1,48 @@
+# chat_files.py
+"""Helpers for the files kept beside an export: caches, indexes, rollups."""
+import json
+import os
+from contextlib import contextmanager
+from typing import IO, Iterator, Union
+
+
+def export_key(path: str) -> dict:
+    """Size and mtime of ``path``, stored with whatever was built from it."""
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = "wb", **kwargs) -> Iterator[IO]:
+    """Write through a temporary file that replaces ``path`` on success.
+
+    Readers see the old file or the new one, never a partial write. The
+    temporary name is per process, so pool workers may share a target.
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, mode, **kwargs) as f:
+            yield f
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write(path: str, data: Union[bytes, str]) -> None:
+    if isinstance(data, bytes):
+        with atomic_open(path, "wb") as f:
+            f.write(data)
+    else:
+        with atomic_open(path, "w", encoding="utf8") as f:
+            f.write(data)
+
+
+def json_bytes(obj):
+    """``obj`` as JSON in a uint8 array, to store beside arrays in an npz."""
+    import numpy as np
+
+    return np.frombuffer(json.dumps(obj).encode("utf8"), dtype=np.uint8)
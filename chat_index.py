@@ -0,0 +1,284 @@
+# chat_index.py
+"""Byte offset of each day in an export, for slicing out date ranges.
+
+The index holds one entry per day: the offset of the first message
+header line of that day. It is built in a single pass and saved beside
+the export as ``CHAT.days.json``. It is rebuilt when the export's size
+or mtime changes. A date range then becomes a byte range with two
+bisects, and reading it costs a seek:
+
+    python chat_index.py chat.txt --last 7
+    python chat_index.py chat.txt --month 2024-03 --report march_reports
+"""
+import argparse
+import io
+import json
+from bisect import bisect_left
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Tuple
+
+from chat_files import atomic_open, export_key
+from chat_parser import (
+    FORMATS,
+    ChatFormat,
+    ChatLog,
+    detect_chat_format,
+    iter_range,
+)
+
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".days.json"
+
+
+@dataclass
+class DayIndex:
+    """``days[i]`` (ISO date) starts at byte ``offsets[i]`` of the export.
+
+    WhatsApp writes exports in chronological order. When a message is
+    dated before the day it follows, ``ordered`` is False and every range
+    covers the whole file; the readers below filter by date either way.
+    """
+
+    version: int
+    size: int
+    mtime_ns: int
+    chat_format: str
+    ordered: bool = True
+    days: List[str] = field(default_factory=list)
+    offsets: List[int] = field(default_factory=list)
+
+    @property
+    def fmt(self) -> ChatFormat:
+        return FORMATS[self.chat_format]
+
+    def byte_range(self, first: date, last: date) -> Tuple[int, int]:
+        """Bytes holding every message dated ``first``..``last`` inclusive."""
+        if not self.ordered:
+            return 0, self.size
+        lo = bisect_left(self.days, first.isoformat())
+        hi = bisect_left(self.days, (last + timedelta(days=1)).isoformat())
+        start = self.offsets[lo] if lo < len(self.offsets) else self.size
+        end = self.offsets[hi] if hi < len(self.offsets) else self.size
+        return start, max(start, end)
+
+    def last_days(self, n: int) -> Tuple[date, date]:
+        """The last ``n`` calendar days, ending on the export's last day."""
+        last = date.fromisoformat(self.days[-1])
+        return last - timedelta(days=n - 1), last
+
+    @staticmethod
+    def month(year: int, month: int) -> Tuple[date, date]:
+        first = date(year, month, 1)
+        nxt = date(year + month // 12, month % 12 + 1, 1)
+        return first, nxt - timedelta(days=1)
+
+
+def index_path_for(path: str) -> str:
+    return f"{path}{INDEX_SUFFIX}"
+
+
+def build_day_index(path: str) -> DayIndex:
+    fmt = detect_chat_format(path)
+    key = export_key(path)
+    index = DayIndex(INDEX_VERSION, key["size"], key["mtime_ns"], fmt.name)
+
+    prev_date_str = None
+    last_day = ""
+    pos = 0
+    line_re = fmt.line_re
+    with open(path, "rb") as f:
+        for line in f:
+            # every header starts with a digit, "[" or (iOS) U+200E
+            if not (line[:1].isdigit() or line[:1] in (b"[", b"\xe2")):
+                pos += len(line)
+                continue
+            text = line.rstrip(b"\r\n").decode("utf8", errors="replace")
+            m = line_re.match(text)
+            if m is not None and m.group(1) != prev_date_str:
+                prev_date_str = m.group(1)
+                day = fmt.decode(m.group(1), m.group(2)).date().isoformat()
+                if day > last_day:
+                    index.days.append(day)
+                    index.offsets.append(pos)
+                    last_day = day
+                elif day < last_day:
+                    index.ordered = False
+            pos += len(line)
+    return index
+
+
+def save_day_index(path: str, index: DayIndex) -> None:
+    with atomic_open(path, "w", encoding="utf8") as f:
+        json.dump(asdict(index), f, separators=(",", ":"))
+
+
+def load_day_index(path: str, rebuild: bool = False) -> DayIndex:
+    """The day index of export ``path``, from disk when still current."""
+    index_path = index_path_for(path)
+    key = export_key(path)
+    if not rebuild:
+        try:
+            with open(index_path, encoding="utf8") as f:
+                index = DayIndex(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            index = None
+        if (
+            index is not None
+            and index.version == INDEX_VERSION
+            and index.size == key["size"]
+            and index.mtime_ns == key["mtime_ns"]
+        ):
+            return index
+
+    index = build_day_index(path)
+    save_day_index(index_path, index)
+    return index
+
+
+def read_lines(path: str, start: int, end: int) -> Iterator[str]:
+    """Raw lines in bytes ``[start, end)``, without line endings.
+
+    Lines are split exactly as iter_range splits them, so characters that
+    str.splitlines also breaks on (U+2028, form feeds, ...) stay in the
+    message text.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    for line in io.TextIOWrapper(io.BytesIO(data), encoding="utf8"):
+        yield line.rstrip("\n")
+
+
+def slice_messages(
+    path: str, index: DayIndex, first: date, last: date
+) -> List[str]:
+    """Messages dated ``first``..``last`` as text, one entry per message.
+
+    Continuation lines stay with their message, as in
+    helper.get_last_day_messages, so the result feeds save_and_print.
+    """
+    start, end = index.byte_range(first, last)
+    fmt = index.fmt
+    messages: List[str] = []
+    keep = index.ordered
+    for line in read_lines(path, start, end):
+        m = fmt.line_re.match(line)
+        if m is not None:
+            if not index.ordered:
+                day = fmt.decode(m.group(1), m.group(2)).date()
+                keep = first <= day <= last
+            if keep:
+                messages.append(line)
+        elif keep:
+            if messages:
+                messages[-1] += "\n" + line
+            else:
+                messages.append(line)
+    return messages
+
+
+def parse_days(path: str, index: DayIndex, first: date, last: date) -> ChatLog:
+    """parse_chat restricted to messages dated ``first``..``last``."""
+    start, end = index.byte_range(first, last)
+    fmt = index.fmt
+    msgs = iter_range(path, start, end, fmt)
+    if not index.ordered:
+        msgs = (m for m in msgs if first <= m.ts.date() <= last)
+    return ChatLog(msgs, chat_format=fmt.name)
+
+
+def _positive_int(s: str) -> int:
+    try:
+        n = int(s)
+    except ValueError:
+        n = 0
+    if n < 1:
+        raise argparse.ArgumentTypeError(
+            f"expected a positive integer, got {s!r}"
+        )
+    return n
+
+
+def _year_month(s: str) -> Tuple[int, int]:
+    try:
+        d = datetime.strptime(s, "%Y-%m")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM, got {s!r}")
+    return d.year, d.month
+
+
+def _iso_date(s: str) -> date:
+    try:
+        return date.fromisoformat(s)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD, got {s!r}")
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        description="Extract or analyse a date range of a WhatsApp export."
+    )
+    ap.add_argument("chat")
+    when = ap.add_mutually_exclusive_group(required=True)
+    when.add_argument(
+        "--last", type=_positive_int, metavar="N", help="the last N days"
+    )
+    when.add_argument("--month", type=_year_month, metavar="YYYY-MM")
+    when.add_argument(
+        "--range",
+        nargs=2,
+        type=_iso_date,
+        metavar=("FIRST", "LAST"),
+        help="ISO dates, inclusive",
+    )
+    ap.add_argument(
+        "--out", default="output.txt", help="file for the extracted messages"
+    )
+    ap.add_argument(
+        "--report",
+        metavar="DIR",
+        help="analyse the range and write per-author reports to DIR instead",
+    )
+    ap.add_argument("--rebuild", action="store_true", help="rebuild the index")
+    args = ap.parse_args(argv)
+    if args.range and args.range[0] > args.range[1]:
+        ap.error("--range: FIRST is after LAST")
+
+    index = load_day_index(args.chat, rebuild=args.rebuild)
+    if not index.days:
+        print("No messages found.")
+        return
+    if args.last is not None:
+        first, last = index.last_days(args.last)
+    elif args.month is not None:
+        first, last = DayIndex.month(*args.month)
+    else:
+        first, last = args.range
+    title = f"Messages {first.isoformat()} to {last.isoformat()}"
+
+    if args.report:
+        from pathlib import Path
+
+        from analyze_chat import write_reports
+        from chat_pipeline import run_stages
+
+        msgs = parse_days(args.chat, index, first, last)
+        if not msgs:
+            print(f"No messages from {first} to {last}.")
+            return
+        out_dir = Path(args.report)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        results = run_stages(
+            msgs, sentiment_cache=str(out_dir / ".sentiment_cache.json")
+        )
+        write_reports(results, out_dir)
+    else:
+        from helper import save_and_print
+
+        messages = slice_messages(args.chat, index, first, last)
+        save_and_print(messages, args.out, title)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# chat_models.py
+"""NLTK resources, each loaded at most once per process.
+
+``get(name)`` loads a resource on first use and keeps it. ``preload()``
+loads them all up front, e.g. in a pool worker initializer. Import and
+load times are recorded in ``timings`` for the startup profile.
+"""
+import importlib
+import time
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+import chat_profile
+
+_LOADERS: Dict[str, Callable[[], object]] = {}
+_loaded: Dict[str, object] = {}
+
+# (label, seconds) in the order things happened
+timings: List[Tuple[str, float]] = []
+
+
+def register(name: str):
+    def deco(loader):
+        _LOADERS[name] = loader
+        return loader
+    return deco
+
+
+def _import(module: str):
+    start = time.perf_counter()
+    mod = importlib.import_module(module)
+    elapsed = time.perf_counter() - start
+    # only the first import costs anything worth reporting
+    if elapsed > 1e-4:
+        timings.append((f"import {module}", elapsed))
+    return mod
+
+
+@register("vader")
+def _load_vader():
+    return _import("nltk.sentiment").SentimentIntensityAnalyzer()
+
+
+@register("stopwords")
+def _load_stopwords():
+    return frozenset(_import("nltk.corpus").stopwords.words("english"))
+
+
+@register("tagger")
+def _load_tagger():
+    return _import("nltk.tag.perceptron").PerceptronTagger()
+
+
+@register("punkt")
+def _load_punkt():
+    tokenize = _import("nltk.tokenize")
+    if hasattr(tokenize, "PunktTokenizer"):
+        return tokenize.PunktTokenizer("english")
+    return _import("nltk.data").load("tokenizers/punkt/english.pickle")
+
+
+@register("treebank")
+def _load_treebank():
+    tokenize = _import("nltk.tokenize")
+    if hasattr(tokenize, "NLTKWordTokenizer"):
+        return tokenize.NLTKWordTokenizer()
+    return tokenize.TreebankWordTokenizer()
+
+
+def get(name: str):
+    res = _loaded.get(name)
+    if res is None:
+        start = time.perf_counter()
+        with chat_profile.span(f"load {name}"):
+            res = _loaded[name] = _LOADERS[name]()
+        timings.append((f"load {name}", time.perf_counter() - start))
+    return res
+
+
+def preload(names: Optional[Iterable[str]] = None) -> None:
+    for name in names if names is not None else _LOADERS:
+        get(name)
+
+
+def sentiment_analyzer():
+    return get("vader")
+
+
+def stopwords() -> FrozenSet[str]:
+    return get("stopwords")
+
+
+def tagger():
+    return get("tagger")
+
+
+def word_tokenize(text: str) -> List[str]:
+    """nltk.word_tokenize without its per-call model lookups."""
+    treebank = get("treebank")
+    return [
+        tok
+        for sent in get("punkt").tokenize(text)
+        for tok in treebank.tokenize(sent)
+    ]
+
+
+def startup_report(total: Optional[float] = None) -> str:
+    lines = ["startup profile"]
+    for label, secs in timings:
+        lines.append(f"  {label:<32} {secs:8.3f}s")
+    if total is not None:
+        lines.append(f"  {'total before analysis':<32} {total:8.3f}s")
+    return "\n".join(lines)
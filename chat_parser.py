@@ -1,12 +1,42 @@
 # chat_parser.py
+import io
+import mmap
+import os
 import re
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
 from dataclasses import dataclass
-from typing import List
+from functools import lru_cache
+from itertools import chain, islice
+from typing import (
+    Callable, Dict, Iterable, Iterator, List, Optional, Pattern, Tuple,
+    TypeVar,
+)
+
+import chat_profile
 
+T = TypeVar("T")
+
+# Android, US locale: "1/31/21, 9:05 PM - Name: text"
 TIME_RE = re.compile(
     r'^(\d{1,2}/\d{1,2}/\d{2}), (\d{1,2}:\d{2}\s*[AP]M) - (.*?): (.*)$'
 )
+# Android, day-first 24h locales: "31/01/2021, 21:05 - Name: text", some
+# with two-digit years
+TIME_RE_24H = re.compile(
+    r'^(\d{1,2}/\d{1,2}/\d{2,4}), (\d{1,2}:\d{2}) - (.*?): (.*)$'
+)
+# iOS: "[31/01/21, 21:05:33] Name: text", media lines start with U+200E
+TIME_RE_IOS = re.compile(
+    r'^\u200e?\[(\d{1,2}/\d{1,2}/\d{2,4}), (\d{1,2}:\d{2}:\d{2})\] '
+    r'(.*?): (.*)$'
+)
+
+# lines sampled from the top of an export to pick its format
+DETECT_SAMPLE_LINES = 500
+
+# files at least this large are parsed in parallel by parse_chat
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024
 
 
 @dataclass
@@ -16,34 +46,325 @@ class Message:
     text: str
 
 
-def parse_chat(path: str) -> List[Message]:
-    msgs: List[Message] = []
+def _year(year: str) -> int:
+    yy = int(year)
+    if len(year) > 2:
+        return yy
+    # same pivot as strptime's %y
+    return 2000 + yy if yy <= 68 else 1900 + yy
+
+
+@lru_cache(maxsize=4096)
+def _decode_date(d: str) -> Tuple[int, int, int]:
+    month, day, year = d.split("/")
+    y, m, dd = _year(year), int(month), int(day)
+    date(y, m, dd)  # validate once; invalid dates raise ValueError
+    return y, m, dd
+
+
+@lru_cache(maxsize=4096)
+def _decode_date_dmy(d: str) -> Tuple[int, int, int]:
+    day, month, year = d.split("/")
+    y, m, dd = _year(year), int(month), int(day)
+    date(y, m, dd)
+    return y, m, dd
+
+
+def decode_timestamp(d: str, t: str) -> datetime:
+    """Decode an ``m/d/yy`` date and ``h:mm AM`` time into a datetime.
+
+    Gives the same result as ``strptime(f"{d} {t}", "%m/%d/%y %I:%M %p")``
+    once narrow no-break spaces are normalised, without the format parsing.
+    """
+    y, mo, dd = _decode_date(d)
+
+    hh, rest = t.split(":", 1)
+    hour = int(hh)
+    minute = int(rest[:2])
+    if not 1 <= hour <= 12:
+        raise ValueError(f"hour out of range in {t!r}")
+    if rest.endswith("PM"):
+        if hour != 12:
+            hour += 12
+    elif hour == 12:
+        hour = 0
+
+    return datetime(y, mo, dd, hour, minute)
 
+
+def decode_timestamp_24h(d: str, t: str) -> datetime:
+    """Decode a ``d/m/yy[yy]`` date and ``HH:MM[:SS]`` time."""
+    y, mo, dd = _decode_date_dmy(d)
+    hms = t.split(":")
+    second = int(hms[2]) if len(hms) > 2 else 0
+    return datetime(y, mo, dd, int(hms[0]), int(hms[1]), second)
+
+
+@dataclass(frozen=True)
+class ChatFormat:
+    name: str
+    line_re: Pattern
+    decode: Callable[[str, str], datetime]
+    # text prefix marking media / system lines, if the format has one
+    skip_mark: str = ""
+
+
+FORMATS: Dict[str, ChatFormat] = {
+    f.name: f
+    for f in (
+        ChatFormat("us_12h", TIME_RE, decode_timestamp),
+        ChatFormat("dmy_24h", TIME_RE_24H, decode_timestamp_24h),
+        ChatFormat("ios", TIME_RE_IOS, decode_timestamp_24h, "\u200e"),
+    )
+}
+DEFAULT_FORMAT = FORMATS["us_12h"]
+
+
+def detect_format(lines: Iterable[str]) -> ChatFormat:
+    """Pick the format whose header regex matches most sampled lines."""
+    hits = dict.fromkeys(FORMATS, 0)
+    for line in lines:
+        line = line.rstrip("\n")
+        for fmt in FORMATS.values():
+            if fmt.line_re.match(line):
+                hits[fmt.name] += 1
+    best = max(hits, key=hits.get)
+    return FORMATS[best] if hits[best] else DEFAULT_FORMAT
+
+
+def detect_chat_format(path: str) -> ChatFormat:
     with open(path, encoding="utf8") as f:
-        for raw_line in f:
-            line = raw_line.rstrip("\n")
+        return detect_format(islice(f, DETECT_SAMPLE_LINES))
+
+
+class ChatLog(list):
+    """List of messages that also records the export format it came from."""
+
+    def __init__(self, msgs: Iterable[Message] = (), chat_format: str = ""):
+        super().__init__(msgs)
+        self.chat_format = chat_format
+
+
+def _skipped(author: str, txt: str, fmt: ChatFormat) -> bool:
+    # system / media / deleted; iOS prefixes those lines with U+200E
+    return (
+        author.startswith("Messages and calls are")
+        or (txt.startswith("<") and txt.endswith(">"))
+        or "message was deleted" in txt
+        or (bool(fmt.skip_mark) and txt.startswith(fmt.skip_mark))
+    )
+
+
+def _iter_messages(
+    lines: Iterable[str], fmt: ChatFormat = DEFAULT_FORMAT
+) -> Iterator[Message]:
+    # A message is only complete once the next kept header (or EOF) shows
+    # up, so it is held back while its continuation lines are collected.
+    pending_ts: Optional[datetime] = None
+    pending_author = ""
+    parts: List[str] = []
+    line_re, decode = fmt.line_re, fmt.decode
+
+    for raw_line in lines:
+        line = raw_line.rstrip("\n")
+
+        m = line_re.match(line)
+        if not m:
+            # continuation of previous message
+            if pending_ts is not None:
+                parts.append(line)
+            continue
+
+        d, t, author, txt = m.groups()
+        if _skipped(author, txt, fmt):
+            continue
+
+        ts = decode(d, t)
+
+        if pending_ts is not None:
+            yield Message(pending_ts, pending_author, "\n".join(parts))
+        pending_ts, pending_author, parts = ts, author, [txt]
+
+    if pending_ts is not None:
+        yield Message(pending_ts, pending_author, "\n".join(parts))
+
+
+def iter_chat(
+    path: str, fmt: Optional[ChatFormat] = None
+) -> Iterator[Message]:
+    """Yield messages one at a time, each as soon as it is complete.
+
+    The export format is detected from the first lines unless given.
+    """
+    with open(path, encoding="utf8") as f:
+        if fmt is None:
+            head = list(islice(f, DETECT_SAMPLE_LINES))
+            fmt = detect_format(head)
+            yield from _iter_messages(chain(head, f), fmt)
+        else:
+            yield from _iter_messages(f, fmt)
+
+
+def iter_range(
+    path: str, start: int, end: int, fmt: Optional[ChatFormat] = None
+) -> Iterator[Message]:
+    """Yield the messages in bytes ``[start, end)`` of an export.
+
+    ``start`` must be 0 or an offset returned by ``split_ranges``.
+    """
+    if fmt is None:
+        fmt = detect_chat_format(path)
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    # TextIOWrapper gives the same newline handling as open() in iter_chat
+    text = io.TextIOWrapper(io.BytesIO(data), encoding="utf8")
+    yield from _iter_messages(text, fmt)
+
+
+def is_message_header(line: bytes, fmt: ChatFormat) -> bool:
+    """Whether a raw export line starts a message the parser keeps."""
+    m = fmt.line_re.match(line.rstrip(b"\r").decode("utf8", errors="replace"))
+    return bool(m) and not _skipped(m.group(3), m.group(4), fmt)
+
+
+def _kept_message_at(buf, pos: int, fmt: ChatFormat) -> bool:
+    end = buf.find(b"\n", pos)
+    return is_message_header(buf[pos:end if end != -1 else len(buf)], fmt)
+
+
+def _next_message_start(buf, pos: int, fmt: ChatFormat) -> int:
+    """First offset >= pos that starts a line holding a kept message.
+
+    Continuation lines always belong to the previous kept message, even
+    across skipped media/system lines, so ranges may only begin at a kept
+    header for the split to be invisible to the parser.
+    """
+    size = len(buf)
+    if pos > 0 and buf[pos - 1] != ord("\n"):
+        nl = buf.find(b"\n", pos)
+        pos = nl + 1 if nl != -1 else size
+    while pos < size and not _kept_message_at(buf, pos, fmt):
+        nl = buf.find(b"\n", pos)
+        pos = nl + 1 if nl != -1 else size
+    return pos
+
+
+def split_ranges(
+    path: str, parts: int, fmt: Optional[ChatFormat] = None
+) -> List[Tuple[int, int]]:
+    """Cut an export into at most ``parts`` byte ranges on message starts."""
+    size = os.path.getsize(path)
+    if size == 0 or parts <= 1:
+        return [(0, size)]
+    if fmt is None:
+        fmt = detect_chat_format(path)
+
+    with open(path, "rb") as f, mmap.mmap(
+        f.fileno(), 0, access=mmap.ACCESS_READ
+    ) as buf:
+        bounds = [0]
+        for k in range(1, parts):
+            pos = max(size * k // parts, bounds[-1])
+            pos = _next_message_start(buf, pos, fmt)
+            if pos >= size:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def last_message_starts(
+    path: str, count: int, fmt: Optional[ChatFormat] = None, block: int = 65536
+) -> List[int]:
+    """Byte offsets of the last ``count`` kept messages, in file order.
+
+    The file is read backwards in blocks, so this only touches the tail.
+    """
+    if fmt is None:
+        fmt = detect_chat_format(path)
+    found: List[int] = []
+    with open(path, "rb") as f:
+        pos = f.seek(0, os.SEEK_END)
+        carry = b""
+        while pos > 0 and len(found) < count:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + carry
+            lines = data.split(b"\n")
+            # the first piece may be the tail of a line that starts earlier
+            first = 1 if pos > 0 else 0
+            carry = lines[0] if pos > 0 else b""
+            end = pos + len(data)
+            for k in range(len(lines) - 1, first - 1, -1):
+                start = end - len(lines[k])
+                if is_message_header(lines[k], fmt):
+                    found.append(start)
+                    if len(found) == count:
+                        break
+                end = start - 1
+    return found[::-1]
+
+
+def parallel_ranges(
+    path: str,
+    workers: Optional[int],
+    fn: Callable[[Tuple[str, int, int, str]], T],
+    fmt: ChatFormat,
+) -> Optional[List[T]]:
+    """``fn((path, start, end, fmt.name))`` over byte ranges of an export.
+
+    Exports of at least ``PARALLEL_MIN_BYTES`` are split on message starts
+    and the ranges mapped in a pool of ``workers`` processes (default: one
+    per CPU); results come back in file order. Returns None when the
+    export should be parsed sequentially instead.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or os.path.getsize(path) < PARALLEL_MIN_BYTES:
+        return None
+    # a few ranges per worker evens out uneven message density
+    ranges = split_ranges(path, workers * 4, fmt)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(
+            fn, [(path, lo, hi, fmt.name) for lo, hi in ranges]
+        ))
+
+
+def _parse_range(args: Tuple[str, int, int, str]) -> List[Message]:
+    path, start, end, fmt_name = args
+    return list(iter_range(path, start, end, FORMATS[fmt_name]))
 
-            m = TIME_RE.match(line)
-            if not m:
-                # continuation of previous message
-                if msgs:
-                    msgs[-1].text += "\n" + line
-                continue
 
-            d, t, author, txt = m.groups()
+def parse_chat(
+    path: str, workers: Optional[int] = None, cache: bool = False
+) -> ChatLog:
+    """Parse a whole export into a list of messages.
 
-            # skip system / media / deleted
-            if author.startswith("Messages and calls are"):
-                continue
-            if txt.startswith("<") and txt.endswith(">"):
-                continue
-            if "message was deleted" in txt:
-                continue
+    The export format is detected from the first ``DETECT_SAMPLE_LINES``
+    lines and recorded as ``chat_format`` on the returned list. Exports
+    of at least ``PARALLEL_MIN_BYTES`` are split into byte ranges that are
+    parsed in a process pool of ``workers`` processes (default: one per
+    CPU) and merged in order; ``workers=1`` forces the sequential parser.
+    Both paths return identical lists.
 
-            # handle narrow no‑break spaces in exported times
-            t_norm = t.replace("\u202f", " ").strip()
-            ts = datetime.strptime(f"{d} {t_norm}", "%m/%d/%y %I:%M %p")
+    With ``cache=True`` the result comes from (and is stored in) the
+    binary cache next to the export, see chat_cache, and is returned as a
+    MessageTable, which behaves like a read-only list of messages.
+    """
+    if cache:
+        from chat_cache import load_cached_table
 
-            msgs.append(Message(ts=ts, author=author, text=txt))
+        return load_cached_table(path, workers=workers)
 
+    fmt = detect_chat_format(path)
+    with chat_profile.span("parse") as sp:
+        parts = parallel_ranges(path, workers, _parse_range, fmt)
+        if parts is not None:
+            msgs = ChatLog(chain.from_iterable(parts), chat_format=fmt.name)
+        else:
+            msgs = ChatLog(iter_chat(path, fmt), chat_format=fmt.name)
+        sp.count(len(msgs))
     return msgs
@@ -0,0 +1,233 @@
+# chat_pipeline.py
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from functools import partial
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import chat_models
+import chat_profile
+from chat_cube import build_cube, daily_from_cube, heatmaps_from_cube
+from chat_sentiment import SentimentScores, score_sentiment
+from chat_sessions import build_session_index, session_stats
+from chat_stats import (
+    basic_stats,
+    word_frequencies,
+    sentiment_scores,
+    confrontational_index,
+    pos_stats,
+    words_not_to_say,
+)
+from chat_tokens import tokenize_corpus
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable
+    # (keyword argument, stage whose result is passed as that argument)
+    deps: Tuple[Tuple[str, str], ...] = ()
+    output: bool = True
+    # cheap enough that each worker computes it rather than receiving it
+    local: bool = False
+
+
+def _given(value, msgs):
+    return value
+
+
+def build_stages(
+    sentiment_cache: Optional[str] = None,
+    fast_pos: bool = False,
+    pos_cache: Optional[str] = None,
+    sentiment: Optional[SentimentScores] = None,
+    approx_words: Optional[int] = None,
+) -> List[Stage]:
+    """The analysis DAG, listed in an order that respects ``deps``.
+
+    With ``jobs > 1`` a stage runs in the worker holding its first
+    intermediate dependency; other intermediates are sent to it once.
+    ``sentiment``, if given, already covers every message and replaces
+    the VADER scoring stage. ``approx_words`` caps the words counted
+    per author, see word_frequencies; the words stage then streams the
+    message texts instead of reading the shared corpus.
+    """
+    if sentiment is not None:
+        vader = partial(_given, sentiment)
+    else:
+        vader = partial(score_sentiment, cache_path=sentiment_cache)
+    return [
+        Stage("vader", vader, output=False),
+        Stage("corpus", tokenize_corpus, output=False),
+        Stage("session_index", build_session_index, output=False, local=True),
+        Stage("basic", basic_stats, (("index", "session_index"),)),
+        Stage("sessions", session_stats, (("index", "session_index"),)),
+        Stage("cube", build_cube, (("sentiment", "vader"),)),
+        Stage("daily", daily_from_cube, (("cube", "cube"),)),
+        Stage("heatmap", heatmaps_from_cube, (("cube", "cube"),)),
+        Stage("words", partial(word_frequencies, approx=approx_words),
+              () if approx_words is not None else (("corpus", "corpus"),)),
+        Stage("sentiment", sentiment_scores, (("sentiment", "vader"),)),
+        Stage("confront", confrontational_index, (("sentiment", "vader"),)),
+        Stage("pos", partial(pos_stats, fast=fast_pos, tag_cache=pos_cache),
+              (("corpus", "corpus"),)),
+        Stage("bad_words", words_not_to_say,
+              (("corpus", "corpus"), ("sentiment", "vader"))),
+    ]
+
+
+# per-worker state, set once by _init_worker so messages cross the process
+# boundary once per worker rather than once per stage; _worker_done keeps
+# every result the worker computed or was sent
+_worker_msgs = None
+_worker_stages: Dict[str, Stage] = {}
+_worker_done: Dict[str, object] = {}
+
+
+def _init_worker(
+    msgs, options: Dict[str, object], profile: Optional[bool]
+) -> None:
+    global _worker_msgs, _worker_stages
+    _worker_msgs = msgs
+    _worker_stages = {s.name: s for s in build_stages(**options)}
+    _worker_done.clear()
+    chat_profile.reset()
+    if profile is not None:
+        chat_profile.enable(trace_memory=profile)
+    chat_models.preload()
+
+
+def _run_stage(st: Stage, msgs, kwargs: Dict[str, object]) -> object:
+    with chat_profile.span(st.name, len(msgs)):
+        return st.func(msgs, **kwargs)
+
+
+def _worker_result(name: str) -> object:
+    if name not in _worker_done:
+        st = _worker_stages[name]
+        kwargs = {kw: _worker_result(dep) for kw, dep in st.deps}
+        _worker_done[name] = _run_stage(st, _worker_msgs, kwargs)
+    return _worker_done[name]
+
+
+def _fetch(name: str) -> object:
+    return _worker_done[name]
+
+
+def _run_in_worker(name: str, sent: Dict[str, object]):
+    _worker_done.update(sent)
+    result = _worker_result(name)
+    if not _worker_stages[name].output:
+        result = None
+    return result, chat_profile.drain()
+
+
+def _run_pool(
+    stages: List[Stage],
+    msgs,
+    jobs: int,
+    options: Dict[str, object],
+) -> Dict[str, object]:
+    """Run the non-local stages on ``jobs`` pinned worker processes.
+
+    A stage is queued on the worker that computed its first intermediate
+    dependency, else one of its dependencies, else the least busy worker.
+    Outputs travel back to this process; an intermediate is fetched from
+    its worker only when a stage elsewhere needs it, and then only once.
+    """
+    by_name = {s.name: s for s in stages}
+    initargs = (
+        msgs,
+        options,
+        chat_profile.memory if chat_profile.enabled else None,
+    )
+    # one single-process pool per worker, so a task can be sent to a
+    # particular process
+    workers = [
+        ProcessPoolExecutor(1, initializer=_init_worker, initargs=initargs)
+        for _ in range(jobs)
+    ]
+    held: List[Set[str]] = [set() for _ in workers]
+    queued = [0] * jobs
+    holder: Dict[str, int] = {}
+    done: Dict[str, object] = {}
+    # intermediates brought back for stages pinned to another worker
+    fetched: Dict[str, object] = {}
+    finished: Set[str] = set()
+    waiting = [s for s in stages if not s.local]
+    running = {}
+
+    def needs(st: Stage) -> List[str]:
+        # local stages are computed inside whichever worker needs them
+        return [dep for _, dep in st.deps if not by_name[dep].local]
+
+    try:
+        while waiting or running:
+            for st in [s for s in waiting if set(needs(s)) <= finished]:
+                # prefer the worker holding an intermediate dependency, so
+                # the big results stay where they were computed
+                pinned = [
+                    holder[d] for d in needs(st) if not by_name[d].output
+                ] or [holder[d] for d in needs(st)]
+                if pinned:
+                    w = pinned[0]
+                else:
+                    w = min(range(jobs), key=queued.__getitem__)
+                # results computed elsewhere, if deps span several workers
+                missing = [d for d in needs(st) if d not in held[w]]
+                unfetched = [
+                    d for d in missing if d not in done and d not in fetched
+                ]
+                if unfetched:
+                    for d in unfetched:
+                        if d not in running.values():
+                            fut = workers[holder[d]].submit(_fetch, d)
+                            running[fut] = d
+                    continue
+                sent = {d: done.get(d, fetched.get(d)) for d in missing}
+                fut = workers[w].submit(_run_in_worker, st.name, sent)
+                held[w].update(sent)
+                held[w].add(st.name)
+                queued[w] += 1
+                holder[st.name] = w
+                running[fut] = (st.name, w)
+                waiting.remove(st)
+
+            ready, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in ready:
+                task = running.pop(fut)
+                if isinstance(task, str):
+                    fetched[task] = fut.result()
+                    continue
+                name, w = task
+                result, spans = fut.result()
+                chat_profile.merge(spans)
+                queued[w] -= 1
+                finished.add(name)
+                if by_name[name].output:
+                    done[name] = result
+    finally:
+        for pool in workers:
+            pool.shutdown()
+    return done
+
+
+def run_stages(msgs, jobs: int = 1, **options) -> Dict[str, object]:
+    """Run every analysis stage over ``msgs`` and return results by name.
+
+    ``options`` are passed to build_stages.
+
+    With ``jobs > 1`` stages run on worker processes as soon as the stages
+    they depend on have finished, see _run_pool. The returned dict has the
+    same keys, in the same order, whatever order the stages complete in.
+    """
+    stages = build_stages(**options)
+    done: Dict[str, object] = {}
+
+    if jobs <= 1:
+        for st in stages:
+            kwargs = {kw: done[dep] for kw, dep in st.deps}
+            done[st.name] = _run_stage(st, msgs, kwargs)
+    else:
+        done = _run_pool(stages, msgs, jobs, options)
+
+    return {st.name: done[st.name] for st in stages if st.output}
@@ -0,0 +1,128 @@
+# chat_pos.py
+"""Type-level POS tagging for pos_stats' fast mode.
+
+Exact mode tags every token of every author. Fast mode tags each distinct
+word once: up to ``samples`` of its occurrences are tagged inside a
+window of ``window`` tokens either side, and the majority tag is used for
+all of its occurrences. Tags are kept in a JSON word -> tag cache that
+can be shared across runs and chats, so known words are never re-tagged.
+
+Compare both modes on an export with:
+
+    python chat_pos.py chat.txt
+"""
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import chat_models
+from chat_files import atomic_open
+
+DEFAULT_TAG_CACHE = os.path.join(
+    os.path.expanduser("~"), ".cache", "whatsappbot", "pos_tags.json"
+)
+
+
+def load_tag_cache(path: Optional[str]) -> Dict[str, str]:
+    if not path:
+        return {}
+    try:
+        with open(path, encoding="utf8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_tag_cache(path: str, tags: Dict[str, str]) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with atomic_open(path, "w", encoding="utf8") as f:
+        json.dump(tags, f, separators=(",", ":"))
+
+
+def tag_types(
+    streams: Iterable[List[str]],
+    samples: int = 3,
+    window: int = 2,
+    cache_path: Optional[str] = None,
+) -> Dict[str, str]:
+    """Return a tag for every word type in ``streams``."""
+    tags = load_tag_cache(cache_path)
+    contexts: Dict[str, List[Tuple[List[str], int]]] = {}
+
+    for tokens in streams:
+        for i, w in enumerate(tokens):
+            if w in tags:
+                continue
+            ctx = contexts.setdefault(w, [])
+            if len(ctx) < samples:
+                lo = max(0, i - window)
+                ctx.append((tokens[lo:i + window + 1], i - lo))
+
+    if not contexts:
+        return tags
+
+    windows = [win for ctx in contexts.values() for win, _ in ctx]
+    tagger = chat_models.tagger()
+    tagged = iter(tagger.tag(win) for win in windows)
+    for w, ctx in contexts.items():
+        votes = Counter(next(tagged)[center][1] for _, center in ctx)
+        tags[w] = votes.most_common(1)[0][0]
+
+    if cache_path:
+        save_tag_cache(cache_path, tags)
+    return tags
+
+
+def pos_agreement(
+    exact: Dict[str, Dict[str, List[str]]],
+    fast: Dict[str, Dict[str, List[str]]],
+) -> Dict[str, Dict[str, float]]:
+    """Share of each exact top-k list that the fast list also contains."""
+    out: Dict[str, Dict[str, float]] = {}
+    for author, lists in exact.items():
+        other = fast.get(author, {})
+        out[author] = {
+            kind: round(
+                len(set(words) & set(other.get(kind, []))) / len(words), 3
+            ) if words else 1.0
+            for kind, words in lists.items()
+        }
+    return out
+
+
+def main():
+    from chat_stats import pos_stats
+    from chat_table import load_table
+    from chat_tokens import tokenize_corpus
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "chat.txt"
+    msgs = load_table(path)
+    corpus = tokenize_corpus(msgs)
+
+    start = time.perf_counter()
+    exact = pos_stats(msgs, corpus=corpus)
+    t_exact = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast = pos_stats(msgs, corpus=corpus, fast=True)
+    t_fast = time.perf_counter() - start
+
+    agreement = pos_agreement(exact, fast)
+    print(f"exact {t_exact:.2f}s, fast {t_fast:.2f}s (uncached, in-memory)")
+    print(f"{'author':<24} {'nouns':>7} {'verbs':>7} {'adjs':>7}")
+    for author, a in agreement.items():
+        print(
+            f"{author[:24]:<24} {a['nouns']:>7.0%} {a['verbs']:>7.0%} "
+            f"{a['adjectives']:>7.0%}"
+        )
+    if agreement:
+        for kind in ("nouns", "verbs", "adjectives"):
+            mean = sum(a[kind] for a in agreement.values()) / len(agreement)
+            print(f"mean {kind} agreement: {mean:.0%}")
+
+
+if __name__ == "__main__":
+    main()
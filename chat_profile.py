@@ -0,0 +1,199 @@
+# chat_profile.py
+"""Opt-in per-stage instrumentation.
+
+    with chat_profile.span("parse") as sp:
+        msgs = parse_chat(path)
+        sp.count(len(msgs))
+
+Each span records wall time, CPU time, item count, the process's peak
+resident set size when it ends and how much the span raised it, and, if
+memory tracing is on, the peak traced Python heap. While profiling is off (the default),
+``span`` returns a shared no-op object and nothing is recorded.
+``report`` prints the spans as a table. ``write_trace`` writes them in
+Chrome's trace event format, which chrome://tracing and Perfetto can
+open.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+enabled = False
+memory = False
+_records: List[dict] = []
+_stack: List["_Span"] = []
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def count(self, n: int) -> None:
+        pass
+
+
+_NULL = _NullSpan()
+
+
+def max_rss() -> Optional[int]:
+    """Peak resident set size of this process so far, in bytes."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes everywhere but macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class _Span:
+    __slots__ = ("name", "items", "depth", "t0", "c0", "peak", "rss0")
+
+    def __init__(self, name: str, items: Optional[int]):
+        self.name = name
+        self.items = items
+        self.peak = 0
+
+    def __enter__(self):
+        self.depth = len(_stack)
+        if memory:
+            if _stack:
+                _stack[-1].peak = max(
+                    _stack[-1].peak, tracemalloc.get_traced_memory()[1]
+                )
+            tracemalloc.reset_peak()
+        _stack.append(self)
+        self.rss0 = max_rss()
+        self.c0 = time.process_time()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.t0
+        cpu = time.process_time() - self.c0
+        _stack.pop()
+        rec = {
+            "name": self.name,
+            "depth": self.depth,
+            "start": self.t0,
+            "wall": wall,
+            "cpu": cpu,
+            "items": self.items,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        }
+        rss = max_rss()
+        if rss is not None:
+            rec["max_rss_bytes"] = rss
+            rec["rss_growth_bytes"] = rss - self.rss0
+        if memory:
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            rec["peak_bytes"] = self.peak
+            if _stack:
+                _stack[-1].peak = max(_stack[-1].peak, self.peak)
+        _records.append(rec)
+        return False
+
+    def count(self, n: int) -> None:
+        self.items = n
+
+
+def span(name: str, items: Optional[int] = None):
+    return _Span(name, items) if enabled else _NULL
+
+
+def enable(trace_memory: bool = False) -> None:
+    """Start recording spans; ``trace_memory`` turns on tracemalloc."""
+    global enabled, memory
+    enabled = True
+    memory = trace_memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def reset() -> None:
+    """Forget all spans, e.g. those a forked worker inherited."""
+    _records.clear()
+    _stack.clear()
+
+
+def drain() -> List[dict]:
+    """Return and forget the spans recorded so far in this process."""
+    out = list(_records)
+    _records.clear()
+    return out
+
+
+def merge(records: List[dict]) -> None:
+    """Add spans recorded in another process under the current span."""
+    depth = len(_stack)
+    for rec in records:
+        _records.append(dict(rec, depth=rec["depth"] + depth))
+
+
+def records() -> List[dict]:
+    return sorted(_records, key=lambda r: r["start"])
+
+
+def report() -> str:
+    recs = records()
+    has_rss = any("max_rss_bytes" in r for r in recs)
+    has_mem = any("peak_bytes" in r for r in recs)
+    head = f"{'stage':<28} {'wall s':>9} {'cpu s':>9} {'items':>10}"
+    if has_rss:
+        head += f" {'rss MB':>9} {'+rss MB':>9}"
+    if has_mem:
+        head += f" {'peak MB':>9}"
+    lines = [head]
+    for r in recs:
+        name = ("  " * r["depth"] + r["name"])[:28]
+        items = "" if r["items"] is None else f"{r['items']:,}"
+        line = f"{name:<28} {r['wall']:>9.3f} {r['cpu']:>9.3f} {items:>10}"
+        if has_rss:
+            if "max_rss_bytes" in r:
+                line += (
+                    f" {r['max_rss_bytes'] / 2**20:>9.1f}"
+                    f" {r['rss_growth_bytes'] / 2**20:>9.1f}"
+                )
+            else:
+                line += f" {'':>9} {'':>9}"
+        if has_mem:
+            peak = r.get("peak_bytes")
+            line += f" {peak / 2**20:>9.1f}" if peak is not None else f" {'':>9}"
+        if r["pid"] != os.getpid():
+            line += f"  (pid {r['pid']})"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def write_trace(path: str) -> None:
+    events: List[Dict[str, object]] = []
+    for r in records():
+        args = {"cpu_s": round(r["cpu"], 6)}
+        if r["items"] is not None:
+            args["items"] = r["items"]
+        for key in ("max_rss_bytes", "rss_growth_bytes", "peak_bytes"):
+            if key in r:
+                args[key] = r[key]
+        events.append({
+            "name": r["name"],
+            "ph": "X",
+            "ts": round(r["start"] * 1e6, 1),
+            "dur": round(r["wall"] * 1e6, 1),
+            "pid": r["pid"],
+            "tid": r["tid"],
+            "args": args,
+        })
+    with open(path, "w", encoding="utf8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
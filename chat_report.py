@@ -1,5 +1,111 @@
 # chat_report.py
-from typing import Dict, List
+import json
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# most points drawn in the "Messages over time" chart; longer histories are
+# bucketed by week or month, then downsampled with LTTB if still too long
+DAILY_POINT_BUDGET = 400
+
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+REPORT_CSS = """\
+    body {
+      font-family: system-ui, -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
+      margin: 0;
+      background: #f5f5f7;
+      color: #111827;
+    }
+    header {
+      background: linear-gradient(135deg, #4f46e5, #6366f1);
+      color: white;
+      padding: 24px 32px;
+      box-shadow: 0 2px 8px rgba(15,23,42,0.25);
+      position: sticky;
+      top: 0;
+      z-index: 10;
+    }
+    h1 { margin: 0 0 4px 0; font-size: 28px; }
+    main {
+      max-width: 960px;
+      margin: 24px auto 40px;
+      padding: 0 16px;
+    }
+    .grid {
+      display: grid;
+      grid-template-columns: minmax(0, 1.2fr) minmax(0, 1fr);
+      gap: 20px;
+      margin-bottom: 24px;
+    }
+    .full-width {
+      grid-column: 1 / -1;
+    }
+    .card {
+      background: white;
+      border-radius: 12px;
+      padding: 16px 18px;
+      box-shadow: 0 1px 3px rgba(15,23,42,0.12);
+      border: 1px solid #e5e7eb;
+    }
+    .card h2 {
+      margin: 0 0 12px 0;
+      font-size: 18px;
+      color: #111827;
+    }
+    table {
+      width: 100%;
+      border-collapse: collapse;
+      font-size: 14px;
+    }
+    th, td {
+      padding: 6px 8px;
+      text-align: left;
+      border-bottom: 1px solid #e5e7eb;
+    }
+    th {
+      width: 55%;
+      color: #4b5563;
+      font-weight: 500;
+    }
+    td {
+      color: #111827;
+    }
+    .tag {
+      display: inline-flex;
+      align-items: center;
+      background: rgba(255,255,255,0.15);
+      border-radius: 999px;
+      padding: 2px 10px;
+      font-size: 12px;
+    }
+    canvas {
+      max-height: 300px;
+    }
+    .note {
+      font-size: 12px;
+      color: #6b7280;
+      margin-bottom: 8px;
+    }
+    .small-list {
+      font-size: 13px;
+      color: #374151;
+    }
+    .small-list span.label {
+      font-weight: 600;
+      color: #111827;
+    }
+    table.heatmap {
+      table-layout: fixed;
+      font-size: 11px;
+    }
+    table.heatmap th, table.heatmap td {
+      width: auto;
+      padding: 0;
+      height: 18px;
+      text-align: center;
+      border: 1px solid white;
+    }
+"""
 
 
 def _escape(s: str) -> str:
@@ -10,6 +116,178 @@ def _escape(s: str) -> str:
     )
 
 
+def lttb(xs: Sequence[float], ys: Sequence[float], budget: int) -> List[int]:
+    """Indices of the points kept by Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last points and, from each of ``budget - 2`` equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the next bucket's average. Peaks and dips
+    survive, unlike with plain averaging or striding.
+    """
+    n = len(xs)
+    if budget >= n or budget < 3:
+        return list(range(n))
+    keep = [0]
+    step = (n - 2) / (budget - 2)
+    a = 0
+    for i in range(budget - 2):
+        lo = int(i * step) + 1
+        hi = int((i + 1) * step) + 1
+        nlo, nhi = hi, min(int((i + 2) * step) + 1, n)
+        avg_x = sum(xs[nlo:nhi]) / (nhi - nlo)
+        avg_y = sum(ys[nlo:nhi]) / (nhi - nlo)
+        ax, ay = xs[a], ys[a]
+        best, best_area = lo, -1.0
+        for j in range(lo, hi):
+            area = abs(
+                (ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay)
+            )
+            if area > best_area:
+                best, best_area = j, area
+        keep.append(best)
+        a = best
+    keep.append(n - 1)
+    return keep
+
+
+def daily_series(
+    daily_counts: Dict[str, int], budget: int = DAILY_POINT_BUDGET
+) -> Tuple[List[str], List[int], str]:
+    """Chart points for ``daily_counts``: (labels, values, unit).
+
+    ``unit`` is "day" when every day fits in ``budget``, otherwise the
+    days are summed into ISO weeks (labelled by their Monday) or months
+    (``YYYY-MM``), and LTTB thins whatever is still over budget. Labels
+    sort like the ``YYYY-MM-DD`` days they cover, so a bucket spans every
+    day from its label up to the next label.
+    """
+    days = sorted(daily_counts.items())
+    if len(days) <= budget:
+        return [d for d, _ in days], [c for _, c in days], "day"
+
+    first, last = date.fromisoformat(days[0][0]), date.fromisoformat(days[-1][0])
+    if (last - first).days // 7 + 2 <= budget:
+        unit = "week"
+
+        def key(d: str) -> str:
+            day = date.fromisoformat(d)
+            return (day - timedelta(days=day.weekday())).isoformat()
+    else:
+        unit = "month"
+
+        def key(d: str) -> str:
+            return d[:7]
+
+    buckets: Dict[str, int] = {}
+    for d, c in days:
+        k = key(d)
+        buckets[k] = buckets.get(k, 0) + c
+    labels, values = list(buckets), list(buckets.values())
+
+    if len(labels) > budget:
+        keep = lttb(range(len(labels)), values, budget)
+        labels = [labels[i] for i in keep]
+        values = [values[i] for i in keep]
+    return labels, values, unit
+
+
+def daily_data_js(daily_counts: Dict[str, int]) -> str:
+    """Every day of ``daily_counts`` as a JSONP script for the zoomed chart.
+
+    A script tag rather than fetch() so reports keep working from file://.
+    """
+    days = sorted(daily_counts.items())
+    data = {"labels": [d for d, _ in days], "values": [c for _, c in days]}
+    return f"dailyDataLoaded({json.dumps(data, separators=(',', ':'))});\n"
+
+
+def _daily_zoom(unit: str, daily_src: Optional[str]) -> Tuple[str, str]:
+    """Note and script for an aggregated daily chart; empty for days."""
+    if unit == "day":
+        return "", ""
+    totals = "Weekly" if unit == "week" else "Monthly"
+    if not daily_src:
+        return f'\n        <p class="note">{totals} totals.</p>', ""
+
+    note = f"""
+        <p class="note">
+          {totals} totals; click a point to see its days.
+          <button id="dailyAll">All days</button>
+          <button id="dailyReset" hidden>Back to {unit}s</button>
+        </p>"""
+    js = f"""
+    const dailyChart = Chart.getChart('dailyChart');
+    const dailyReset = document.getElementById('dailyReset');
+    let dailyFull = null;
+    function dailyDataLoaded(d) {{ dailyFull = d; }}
+    function withDailyData(cb) {{
+      if (dailyFull) {{ cb(); return; }}
+      const s = document.createElement('script');
+      s.src = {json.dumps(daily_src)};
+      s.onload = cb;
+      document.head.appendChild(s);
+    }}
+    function showDays(first, end) {{
+      withDailyData(() => {{
+        const days = dailyFull.labels;
+        let lo = days.findIndex(d => d >= first);
+        let hi = end === undefined ? -1 : days.findIndex(d => d >= end);
+        if (lo < 0) lo = days.length;
+        if (hi < 0) hi = days.length;
+        dailyChart.data.labels = days.slice(lo, hi);
+        dailyChart.data.datasets[0].data = dailyFull.values.slice(lo, hi);
+        dailyChart.data.datasets[0].label = 'Messages per day';
+        dailyChart.update();
+        dailyReset.hidden = false;
+      }});
+    }}
+    dailyChart.options.interaction = {{ mode: 'index', intersect: false }};
+    dailyChart.options.onClick = (evt, points) => {{
+      if (!points.length || dailyChart.data.labels !== labels) return;
+      const i = points[0].index;
+      showDays(labels[Math.max(i - 1, 0)], labels[i + 2]);
+    }};
+    document.getElementById('dailyAll').onclick = () => showDays('');
+    dailyReset.onclick = () => {{
+      dailyChart.data.labels = labels;
+      dailyChart.data.datasets[0].data = data;
+      dailyChart.data.datasets[0].label = 'Messages per {unit}';
+      dailyChart.update();
+      dailyReset.hidden = true;
+    }};
+"""
+    return note, js
+
+
+def heatmap_html(grid: List[List[int]]) -> str:
+    """Weekday x hour table, each cell shaded relative to the busiest one."""
+    peak = max((c for row in grid for c in row), default=0) or 1
+    head = "".join(f"<th>{h:02d}</th>" for h in range(24))
+    rows = []
+    for name, row in zip(WEEKDAYS, grid):
+        cells = "".join(
+            f'<td title="{name} {h:02d}:00: {c}" '
+            f'style="background: rgba(79,70,229,{c / peak:.2f})"></td>'
+            for h, c in enumerate(row)
+        )
+        rows.append(f"<tr><th>{name}</th>{cells}</tr>")
+    return (
+        f'<table class="heatmap"><tr><th></th>{head}</tr>{"".join(rows)}</table>'
+    )
+
+
+def conversation_rows(info: Dict[str, object]) -> List[Tuple[str, str]]:
+    """Display rows for one author's chat_sessions.session_stats entry."""
+    rows = []
+    for k, v in info.items():
+        if v is None:
+            v = "-"
+        elif isinstance(v, list):
+            v = ", ".join(f"{name} ({n})" for name, n in v) or "-"
+        rows.append((k, str(v)))
+    return rows
+
+
 def author_html(
     author: str,
     stats: Dict[str, float],
@@ -20,10 +298,21 @@ def author_html(
     pos_info: Dict[str, list],
     bad_words: list,
     hourly_activity: List[float],
+    daily_src: Optional[str] = None,
+    point_budget: int = DAILY_POINT_BUDGET,
+    heatmap: Optional[List[List[int]]] = None,
+    conversation: Optional[Dict[str, object]] = None,
 ) -> str:
-    days_sorted = sorted(daily_counts.items())
-    labels = [d for d, _ in days_sorted]
-    values = [c for _, c in days_sorted]
+    """Self-contained HTML report for one author.
+
+    Long histories are charted as weekly or monthly totals. If
+    ``daily_src`` names a script written with daily_data_js, clicking the
+    chart loads it and zooms into the clicked period day by day.
+    ``heatmap`` holds weekday x hour message counts (Monday first) and
+    ``conversation`` the author's chat_sessions.session_stats entry.
+    """
+    labels, values, unit = daily_series(daily_counts, point_budget)
+    daily_note, zoom_js = _daily_zoom(unit, daily_src)
 
     labels_js = ",".join(f"'{d}'" for d in labels)
     values_js = ",".join(str(v) for v in values)
@@ -60,6 +349,26 @@ def author_html(
     adjs_list = ", ".join(_escape(w) for w in pos_info.get("adjectives", []))
     bad_list = ", ".join(_escape(w) for w in bad_words[:15])
 
+    conversation_card = ""
+    if conversation:
+        rows = "".join(
+            f"<tr><th>{_escape(k)}</th><td>{_escape(v)}</td></tr>"
+            for k, v in conversation_rows(conversation)
+        )
+        conversation_card = f"""
+      <section class="card full-width">
+        <h2>Conversation</h2>
+        <table>{rows}</table>
+      </section>"""
+
+    heatmap_card = ""
+    if heatmap:
+        heatmap_card = f"""
+      <section class="card full-width">
+        <h2>Messages by weekday and hour</h2>
+        {heatmap_html(heatmap)}
+      </section>"""
+
     html = f"""
 <!DOCTYPE html>
 <html lang="en">
@@ -68,91 +377,7 @@ def author_html(
   <title>Chat analytics - {_escape(author)}</title>
   <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
   <style>
-    body {{
-      font-family: system-ui, -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
-      margin: 0;
-      background: #f5f5f7;
-      color: #111827;
-    }}
-    header {{
-      background: linear-gradient(135deg, #4f46e5, #6366f1);
-      color: white;
-      padding: 24px 32px;
-      box-shadow: 0 2px 8px rgba(15,23,42,0.25);
-      position: sticky;
-      top: 0;
-      z-index: 10;
-    }}
-    h1 {{ margin: 0 0 4px 0; font-size: 28px; }}
-    main {{
-      max-width: 960px;
-      margin: 24px auto 40px;
-      padding: 0 16px;
-    }}
-    .grid {{
-      display: grid;
-      grid-template-columns: minmax(0, 1.2fr) minmax(0, 1fr);
-      gap: 20px;
-      margin-bottom: 24px;
-    }}
-    .full-width {{
-      grid-column: 1 / -1;
-    }}
-    .card {{
-      background: white;
-      border-radius: 12px;
-      padding: 16px 18px;
-      box-shadow: 0 1px 3px rgba(15,23,42,0.12);
-      border: 1px solid #e5e7eb;
-    }}
-    .card h2 {{
-      margin: 0 0 12px 0;
-      font-size: 18px;
-      color: #111827;
-    }}
-    table {{
-      width: 100%;
-      border-collapse: collapse;
-      font-size: 14px;
-    }}
-    th, td {{
-      padding: 6px 8px;
-      text-align: left;
-      border-bottom: 1px solid #e5e7eb;
-    }}
-    th {{
-      width: 55%;
-      color: #4b5563;
-      font-weight: 500;
-    }}
-    td {{
-      color: #111827;
-    }}
-    .tag {{
-      display: inline-flex;
-      align-items: center;
-      background: rgba(255,255,255,0.15);
-      border-radius: 999px;
-      padding: 2px 10px;
-      font-size: 12px;
-    }}
-    canvas {{
-      max-height: 300px;
-    }}
-    .note {{
-      font-size: 12px;
-      color: #6b7280;
-      margin-bottom: 8px;
-    }}
-    .small-list {{
-      font-size: 13px;
-      color: #374151;
-    }}
-    .small-list span.label {{
-      font-weight: 600;
-      color: #111827;
-    }}
-  </style>
+{REPORT_CSS}  </style>
 </head>
 <body>
   <header>
@@ -190,12 +415,12 @@ def author_html(
       <section class="card full-width">
         <h2>Messages by hour (normalized)</h2>
         <canvas id="hourlyChart" height="120"></canvas>
-      </section>
+      </section>{heatmap_card}{conversation_card}
     </section>
 
     <div class="grid">
       <section class="card">
-        <h2>Messages over time</h2>
+        <h2>Messages over time</h2>{daily_note}
         <canvas id="dailyChart" height="80"></canvas>
       </section>
       <section class="card">
@@ -215,7 +440,7 @@ def author_html(
       data: {{
         labels: labels,
         datasets: [{{
-          label: 'Messages per day',
+          label: 'Messages per {unit}',
           data: data,
           borderColor: '#4f46e5',
           backgroundColor: 'rgba(79,70,229,0.12)',
@@ -234,7 +459,7 @@ def author_html(
         plugins: {{ legend: {{ display: false }} }}
       }}
     }});
-
+{zoom_js}
     const hourLabels = [{hour_labels}];
     const hourData = [{hour_values}];
     const ctxHour = document.getElementById('hourlyChart').getContext('2d');
@@ -293,3 +518,63 @@ def author_html(
 def write_html(path: str, html: str) -> None:
     with open(path, "w", encoding="utf8") as f:
         f.write(html)
+
+
+def batch_index_html(entries: List[dict], total_seconds: float) -> str:
+    """Index page for a chat_batch run: one row per export."""
+    rows = []
+    for e in entries:
+        links = ", ".join(
+            f'<a href="{_escape(e["dir"])}/{_escape(fname)}">{_escape(a)}</a>'
+            for a, fname in e.get("reports", {}).items()
+        )
+        detail = links or _escape(e.get("error", ""))
+        rows.append(
+            f'<tr class="{e["status"]}"><td>{_escape(e["chat"])}</td>'
+            f'<td>{e["status"]}</td><td>{e.get("messages", 0)}</td>'
+            f'<td>{e["seconds"]:.2f}</td><td>{detail}</td></tr>'
+        )
+    ok = sum(e["status"] == "ok" for e in entries)
+
+    return f"""
+<!DOCTYPE html>
+<html lang="en">
+<head>
+  <meta charset="utf-8" />
+  <title>Chat analytics - batch summary</title>
+  <style>
+    body {{
+      font-family: system-ui, -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif;
+      margin: 24px auto;
+      max-width: 1100px;
+      padding: 0 16px;
+      background: #f5f5f7;
+      color: #111827;
+    }}
+    table {{
+      width: 100%;
+      border-collapse: collapse;
+      font-size: 14px;
+      background: white;
+    }}
+    th, td {{
+      padding: 6px 8px;
+      text-align: left;
+      border-bottom: 1px solid #e5e7eb;
+      vertical-align: top;
+    }}
+    th {{ color: #4b5563; font-weight: 500; }}
+    tr.failed td, tr.timeout td {{ color: #b91c1c; }}
+    tr.empty td {{ color: #6b7280; }}
+  </style>
+</head>
+<body>
+  <h1>Batch summary</h1>
+  <p>{ok} of {len(entries)} chats analysed in {total_seconds:.1f}s.</p>
+  <table>
+    <tr><th>Chat</th><th>Status</th><th>Messages</th><th>Seconds</th><th>Reports</th></tr>
+    {"".join(rows)}
+  </table>
+</body>
+</html>
+"""
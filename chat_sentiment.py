@@ -0,0 +1,97 @@
+# chat_sentiment.py
+import hashlib
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from chat_files import atomic_open
+from chat_models import sentiment_analyzer
+from chat_parser import Message
+
+_SCORE_KEYS = ("neg", "neu", "pos", "compound")
+
+def _text_key(txt: str) -> str:
+    return hashlib.sha1(txt.encode("utf8")).hexdigest()
+
+
+@dataclass
+class SentimentScores:
+    """VADER scores for every distinct message text, computed once per run.
+
+    ``rows``, when set by score_sentiment, holds (pos, neg, compound) for
+    each of the messages it was given, in order, with NaN for blank texts.
+    """
+
+    by_text: Dict[str, Dict[str, float]] = field(default_factory=dict)
+    rows: Optional[np.ndarray] = None
+
+    def polarity(self, txt: str) -> Dict[str, float]:
+        vs = self.by_text.get(txt)
+        if vs is None:
+            vs = self.by_text[txt] = sentiment_analyzer().polarity_scores(txt)
+        return vs
+
+    def row_scores(self, msgs) -> np.ndarray:
+        """(pos, neg, compound) per message of ``msgs``, NaN where blank.
+
+        ``rows`` is reused when it covers as many messages as ``msgs``, so
+        pass the messages the scores were computed from.
+        """
+        if self.rows is not None and len(self.rows) == len(msgs):
+            return self.rows
+        return self._rows(m.text.strip() for m in msgs)
+
+    def _rows(self, texts: Iterable[str]) -> np.ndarray:
+        blank = (np.nan, np.nan, np.nan)
+        out = []
+        for txt in texts:
+            if txt:
+                vs = self.polarity(txt)
+                out.append((vs["pos"], vs["neg"], vs["compound"]))
+            else:
+                out.append(blank)
+        return np.array(out, dtype=np.float64).reshape(-1, 3)
+
+
+def _load_cache(path: str) -> Dict[str, list]:
+    try:
+        with open(path, encoding="utf8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(path: str, cache: Dict[str, list]) -> None:
+    with atomic_open(path, "w", encoding="utf8") as f:
+        json.dump(cache, f, separators=(",", ":"))
+
+
+def score_sentiment(
+    msgs: Iterable[Message], cache_path: Optional[str] = None
+) -> SentimentScores:
+    row_texts: List[str] = [m.text.strip() for m in msgs]
+    texts = set(row_texts)
+    texts.discard("")
+
+    cache = _load_cache(cache_path) if cache_path else {}
+    dirty = False
+
+    scores = SentimentScores()
+    for txt in texts:
+        key = _text_key(txt)
+        row = cache.get(key)
+        if row is None:
+            vs = sentiment_analyzer().polarity_scores(txt)
+            cache[key] = [vs[k] for k in _SCORE_KEYS]
+            dirty = True
+        else:
+            vs = dict(zip(_SCORE_KEYS, row))
+        scores.by_text[txt] = vs
+
+    if cache_path and dirty:
+        _save_cache(cache_path, cache)
+
+    scores.rows = scores._rows(row_texts)
+    return scores
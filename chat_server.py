@@ -0,0 +1,427 @@
+# chat_server.py
+"""Local HTTP server that keeps parsed exports and NLTK models in memory.
+
+    python chat_server.py chat.txt family.txt --port 8765
+
+Each export is parsed once (through the binary cache, see chat_cache),
+its messages are scored with VADER once, and its rollup cube (see
+chat_cube) is loaded or built. After that every query only pays for its
+own date range. Endpoints, all GET:
+
+    /chats                               loaded exports
+    /stats?chat=&from=&to=               basic_stats per author
+    /words?chat=&from=&to=&top=&author=  top words per author
+    /sentiment?chat=&from=&to=           sentiment per author (from the cube)
+    /report?chat=&author=&from=&to=      author_html for one author
+
+``from`` and ``to`` are inclusive ISO dates and both optional; ``chat``
+may be left out when only one export is loaded. Results are kept in an
+LRU cache keyed by query; the entry is added as soon as a query starts,
+so identical queries arriving together share one computation. An export
+that changes on disk is reloaded on its next query.
+
+Queries are computed on a thread pool so the event loop keeps
+accepting, but they are CPU-bound Python and share the GIL: distinct
+slow queries run one at a time.
+"""
+import argparse
+import asyncio
+import json
+import time
+import traceback
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from http import HTTPStatus
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import chat_models
+from chat_batch import report_dirs
+from chat_cube import RollupCube, build_cube, cube_path_for, load_cube, save_cube
+from chat_files import export_key
+from chat_parser import parse_chat
+from chat_pipeline import run_stages
+from chat_pos import DEFAULT_TAG_CACHE
+from chat_report import author_html
+from chat_sentiment import SentimentScores, score_sentiment
+from chat_stats import basic_stats, word_frequencies
+from chat_table import MessageTable
+
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_SIZE = 256
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str = ""):
+        super().__init__(message or status.phrase)
+        self.status = status
+
+
+class ResultCache:
+    """Least-recently-used mapping of query keys to results (futures)."""
+
+    def __init__(self, capacity: int = DEFAULT_CACHE_SIZE):
+        self.capacity = capacity
+        self._items: "OrderedDict[Hashable, object]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.capacity:
+            self._items.popitem(last=False)
+
+    def discard(self, key: Hashable, value) -> None:
+        """Drop ``key`` if it still maps to ``value``."""
+        if self._items.get(key) is value:
+            del self._items[key]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+@dataclass
+class LoadedChat:
+    name: str
+    path: str
+    key: dict
+    table: MessageTable
+    sentiment: SentimentScores
+    cube: RollupCube
+
+    @property
+    def version(self) -> Tuple[int, int]:
+        return self.key["size"], self.key["mtime_ns"]
+
+
+def load_chat(
+    name: str, path: str, sentiment_cache: Optional[str] = None
+) -> LoadedChat:
+    key = export_key(path)
+    table = parse_chat(path, cache=True)
+    if len(table) and (table.ts[1:] < table.ts[:-1]).any():
+        # date ranges are looked up by bisecting the timestamps
+        table = MessageTable.from_messages(
+            sorted(table, key=lambda m: m.ts), table.chat_format
+        )
+    sentiment = score_sentiment(table, sentiment_cache)
+    cube = load_cube(cube_path_for(path), key)
+    if cube is None:
+        cube = build_cube(table, sentiment)
+        save_cube(cube_path_for(path), cube, key)
+    return LoadedChat(name, path, key, table, sentiment, cube)
+
+
+def _window_sentiment(cube: RollupCube, first, last):
+    return cube.window(first, last).sentiment()
+
+
+def _date_param(query: Dict[str, str], name: str) -> Optional[date]:
+    value = query.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name}: expected YYYY-MM-DD")
+
+
+def _int_param(query: Dict[str, str], name: str, default: int) -> int:
+    try:
+        return int(query.get(name, default))
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name}: expected an integer")
+
+
+class ChatServer:
+    def __init__(
+        self,
+        paths: List[str],
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        sentiment_cache: Optional[str] = None,
+        fast_pos: bool = False,
+        pos_cache: Optional[str] = None,
+    ):
+        self.paths = {name: path for path, name in report_dirs(paths).items()}
+        self.sentiment_cache = sentiment_cache
+        self.stage_options = {
+            "fast_pos": fast_pos,
+            "pos_cache": pos_cache or DEFAULT_TAG_CACHE,
+        }
+        self.chats: Dict[str, LoadedChat] = {}
+        self.cache = ResultCache(cache_size)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.routes: Dict[str, Callable] = {
+            "/chats": self.chats_info,
+            "/stats": self.stats,
+            "/words": self.words,
+            "/sentiment": self.sentiment,
+            "/report": self.report,
+        }
+
+    def load_all(self, log=print) -> None:
+        chat_models.preload()
+        for name, path in self.paths.items():
+            start = time.perf_counter()
+            chat = self.chats[name] = load_chat(name, path, self.sentiment_cache)
+            log(
+                f"Loaded {name}: {len(chat.table):,} messages "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+
+    async def _run(self, func, *args):
+        # CPU-bound work goes to a thread so the loop keeps accepting
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def chat(self, query: Dict[str, str]) -> LoadedChat:
+        name = query.get("chat")
+        if name is None:
+            if len(self.paths) != 1:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "chat: required")
+            name = next(iter(self.paths))
+        if name not in self.paths:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"no chat named {name!r}")
+
+        lock = self._locks.setdefault(name, asyncio.Lock())
+        async with lock:
+            chat = self.chats.get(name)
+            if chat is None or export_key(chat.path) != chat.key:
+                chat = self.chats[name] = await self._run(
+                    load_chat, name, self.paths[name], self.sentiment_cache
+                )
+        return chat
+
+    async def cached(self, key: Hashable, func, *args):
+        fut = self.cache.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(self._run(func, *args))
+            self.cache.put(key, fut)
+
+            def forget_failure(done):
+                # failures are not cached; the next identical query retries
+                if done.cancelled() or done.exception() is not None:
+                    self.cache.discard(key, done)
+
+            fut.add_done_callback(forget_failure)
+        # one waiter giving up must not cancel the others' computation
+        return await asyncio.shield(fut)
+
+    @staticmethod
+    def _range(chat: LoadedChat, query: Dict[str, str]):
+        first, last = _date_param(query, "from"), _date_param(query, "to")
+        return first, last, chat.table.rows(*chat.table.date_rows(first, last))
+
+    def _results(self, chat: LoadedChat, first, last) -> Dict[str, object]:
+        msgs = chat.table.rows(*chat.table.date_rows(first, last))
+        if not len(msgs):
+            return {}
+        return run_stages(msgs, sentiment=chat.sentiment, **self.stage_options)
+
+    async def chats_info(self, query: Dict[str, str]):
+        out = []
+        for name in self.paths:
+            chat = await self.chat({"chat": name})
+            days = chat.cube.n_days
+            out.append({
+                "chat": name,
+                "path": chat.path,
+                "messages": len(chat.table),
+                "authors": chat.cube.authors,
+                "first": chat.cube.day(0).isoformat() if days else None,
+                "last": chat.cube.day(days - 1).isoformat() if days else None,
+            })
+        return {
+            "chats": out,
+            "cache": {
+                "entries": len(self.cache),
+                "hits": self.cache.hits,
+                "misses": self.cache.misses,
+            },
+        }
+
+    async def stats(self, query: Dict[str, str]):
+        chat = await self.chat(query)
+        first, last, msgs = self._range(chat, query)
+        stats = await self.cached(
+            ("stats", chat.name, chat.version, first, last), basic_stats, msgs
+        )
+        return {"chat": chat.name, "messages": len(msgs), "authors": stats}
+
+    async def words(self, query: Dict[str, str]):
+        chat = await self.chat(query)
+        first, last, msgs = self._range(chat, query)
+        top = _int_param(query, "top", 20)
+        freqs = await self.cached(
+            ("words", chat.name, chat.version, first, last),
+            word_frequencies,
+            msgs,
+        )
+        author = query.get("author")
+        if author is not None:
+            if author not in freqs:
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"no messages by {author!r}")
+            freqs = {author: freqs[author]}
+        return {
+            "chat": chat.name,
+            "authors": {a: c.most_common(top) for a, c in freqs.items()},
+        }
+
+    async def sentiment(self, query: Dict[str, str]):
+        chat = await self.chat(query)
+        first = _date_param(query, "from")
+        last = _date_param(query, "to")
+        sentiment = await self.cached(
+            ("sentiment", chat.name, chat.version, first, last),
+            _window_sentiment,
+            chat.cube,
+            first,
+            last,
+        )
+        return {"chat": chat.name, "authors": sentiment}
+
+    async def report(self, query: Dict[str, str]):
+        chat = await self.chat(query)
+        author = query.get("author")
+        if not author:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "author: required")
+        first, last = _date_param(query, "from"), _date_param(query, "to")
+        results = await self.cached(
+            ("results", chat.name, chat.version, first, last),
+            self._results,
+            chat,
+            first,
+            last,
+        )
+        stats = results.get("basic", {}).get(author)
+        if stats is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"no messages by {author!r}")
+        return author_html(
+            author,
+            stats,
+            results["daily"].get(author, {}),
+            dict(results["words"].get(author, {})),
+            results["sentiment"].get(author, {}),
+            results["confront"].get(author, 0.0),
+            results["pos"].get(author, {"nouns": [], "verbs": [], "adjectives": []}),
+            results["bad_words"].get(author, []),
+            stats.get("Hourly activity", [0] * 24),
+            heatmap=results["heatmap"].get(author),
+            conversation=results["sessions"].get(author),
+        )
+
+    async def dispatch(
+        self, method: str, target: str
+    ) -> Tuple[HTTPStatus, str, bytes]:
+        if method != "GET":
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+        url = urlsplit(target)
+        handler = self.routes.get(url.path.rstrip("/") or "/chats")
+        if handler is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"no endpoint {url.path}")
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        body = await handler(query)
+        if isinstance(body, str):
+            return HTTPStatus.OK, "text/html; charset=utf-8", body.encode("utf8")
+        return (
+            HTTPStatus.OK,
+            "application/json",
+            json.dumps(body, ensure_ascii=False).encode("utf8"),
+        )
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request_line = (await reader.readline()).decode("latin-1")
+            # headers are not needed, only skipped
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            try:
+                method, target, _ = request_line.split(" ", 2)
+                status, ctype, body = await self.dispatch(method, target)
+            except HTTPError as e:
+                status, ctype = e.status, "application/json"
+                body = json.dumps({"error": str(e)}).encode("utf8")
+            except ValueError:
+                status, ctype = HTTPStatus.BAD_REQUEST, "application/json"
+                body = b'{"error": "malformed request"}'
+            except Exception:
+                # a bug in one handler must not drop the connection unanswered
+                traceback.print_exc()
+                status, ctype = HTTPStatus.INTERNAL_SERVER_ERROR, "application/json"
+                body = b'{"error": "internal error"}'
+            writer.write(
+                f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: {ctype}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Serving {len(self.paths)} chat(s) on http://{host}:{port}/chats")
+        async with server:
+            await server.serve_forever()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(
+        description="Serve stats for WhatsApp exports kept in memory."
+    )
+    ap.add_argument("chats", nargs="+", help="export files")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=DEFAULT_PORT)
+    ap.add_argument(
+        "--cache-size",
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        help="query results kept in memory (least recently used go first)",
+    )
+    ap.add_argument(
+        "--sentiment-cache",
+        default=None,
+        help="VADER score cache file shared across runs",
+    )
+    ap.add_argument(
+        "--fast-pos",
+        action="store_true",
+        help="tag each word type once in /report (approximate)",
+    )
+    ap.add_argument(
+        "--pos-cache", default=None, help="word->tag cache for --fast-pos"
+    )
+    args = ap.parse_args(argv)
+
+    server = ChatServer(
+        args.chats,
+        cache_size=args.cache_size,
+        sentiment_cache=args.sentiment_cache,
+        fast_pos=args.fast_pos,
+        pos_cache=args.pos_cache,
+    )
+    server.load_all()
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
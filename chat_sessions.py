@@ -0,0 +1,356 @@
+# chat_sessions.py
+"""Conversation sessions, turns and replies as arrays over sorted messages.
+
+A session ends when nobody writes for longer than ``threshold`` seconds,
+by default three times the median gap between consecutive messages (the
+cut "Mid-conversation exits" has always used). A turn starts wherever
+the author changes. A turn inside a session is a reply to the previous
+author, and the gap before it is the reply latency.
+
+Everything is computed once in O(n) and shared by basic_stats, the
+reply-time percentiles and the who-replies-to-whom matrix:
+
+    python chat_sessions.py chat.txt
+"""
+import argparse
+from collections import Counter
+from datetime import timedelta
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from chat_table import EPOCH
+
+PERCENTILES = (50, 90)
+# partners listed per author in session_stats
+TOP_PARTNERS = 3
+
+
+def _group_order(keys: np.ndarray, n_groups: int) -> np.ndarray:
+    """Stable order grouping equal ``keys`` (author ids)."""
+    # numpy's stable sort is a linear-time radix sort for 16-bit keys
+    if n_groups <= np.iinfo(np.int16).max:
+        keys = keys.astype(np.int16)
+    return np.argsort(keys, kind="stable")
+
+
+class SessionIndex:
+    """Per-message arrays, all in timestamp order.
+
+    ``ts``         int64 seconds since 1970-01-01
+    ``author``     int32 ids into ``authors``
+    ``gap``        seconds since the previous message (0 for the first)
+    ``session``    int32 session number, from 0
+    ``turn``       True where the author differs from the previous message
+    ``reply_to``   author replied to, for turns inside a session, else -1
+    ``prev_same``  index of the same author's previous message, else -1
+    """
+
+    def __init__(
+        self,
+        authors: List[str],
+        ts: np.ndarray,
+        author: np.ndarray,
+        threshold: Optional[float] = None,
+    ):
+        n = len(ts)
+        self.authors = authors
+        self.ts = ts
+        self.author = author
+
+        gap = np.zeros(n, dtype=np.int64)
+        gap[1:] = np.diff(ts)
+        self.gap = gap
+        if n > 1:
+            k = (n - 1) // 2
+            self.median_gap = float(np.partition(gap[1:], k)[k])
+        else:
+            self.median_gap = 0.0
+        self.threshold = self.median_gap * 3 if threshold is None else threshold
+
+        starts = gap > self.threshold
+        starts[:1] = True
+        self.session_starts = np.flatnonzero(starts)
+        self.session = (np.cumsum(starts) - 1).astype(np.int32)
+
+        turn = np.ones(n, dtype=bool)
+        turn[1:] = author[1:] != author[:-1]
+        self.turn = turn
+        replies = np.flatnonzero(turn & ~starts)
+        self.reply_to = np.full(n, -1, dtype=np.int32)
+        self.reply_to[replies] = author[replies - 1]
+
+        by_author = _group_order(author, len(authors))
+        same = author[by_author[1:]] == author[by_author[:-1]]
+        self.prev_same = np.full(n, -1, dtype=np.int64)
+        self.prev_same[by_author[1:][same]] = by_author[:-1][same]
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    @property
+    def n_sessions(self) -> int:
+        return len(self.session_starts)
+
+    def silences(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(author, seconds) of every gap between an author's own messages."""
+        later = np.flatnonzero(self.prev_same >= 0)
+        return (
+            self.author[later],
+            (self.ts[later] - self.ts[self.prev_same[later]]).astype(np.float64),
+        )
+
+    def exits(self) -> np.ndarray:
+        """Per author, silences longer than the session threshold."""
+        who, secs = self.silences()
+        return np.bincount(
+            who[secs > self.threshold], minlength=len(self.authors)
+        )
+
+    def sessions_started(self) -> np.ndarray:
+        return np.bincount(
+            self.author[self.session_starts], minlength=len(self.authors)
+        )
+
+    def reply_matrix(self) -> np.ndarray:
+        """``m[a, b]``: replies by author ``a`` to author ``b``."""
+        n_authors = len(self.authors)
+        replies = np.flatnonzero(self.reply_to >= 0)
+        cells = (
+            self.author[replies].astype(np.int64) * n_authors
+            + self.reply_to[replies]
+        )
+        return np.bincount(
+            cells, minlength=n_authors * n_authors
+        ).reshape(n_authors, n_authors)
+
+    def reply_times(
+        self, percentiles: Sequence[float] = PERCENTILES
+    ) -> np.ndarray:
+        """Reply latency percentiles in seconds, shape (authors, len(q)).
+
+        Rows of authors who never replied are NaN.
+        """
+        n_authors = len(self.authors)
+        replies = np.flatnonzero(self.reply_to >= 0)
+        who = self.author[replies]
+        order = _group_order(who, n_authors)
+        latency = self.gap[replies][order]
+        bounds = np.r_[0, np.cumsum(np.bincount(who, minlength=n_authors))]
+
+        out = np.full((n_authors, len(percentiles)), np.nan)
+        for a in range(n_authors):
+            lo, hi = bounds[a], bounds[a + 1]
+            if hi > lo:
+                out[a] = np.percentile(latency[lo:hi], percentiles)
+        return out
+
+
+def _percentiles(
+    values: np.ndarray, counts: np.ndarray, percentiles: Sequence[float]
+) -> np.ndarray:
+    """np.percentile (linear) of sorted ``values`` repeated ``counts`` times."""
+    ends = np.cumsum(counts)
+    pos = np.asarray(percentiles, dtype=np.float64) / 100 * (ends[-1] - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, ends[-1] - 1)
+    below = values[np.searchsorted(ends, lo, side="right")]
+    above = values[np.searchsorted(ends, hi, side="right")]
+    return below + (above - below) * (pos - lo)
+
+
+class SessionCounts:
+    """What session_stats needs from a SessionIndex, as running histograms.
+
+    ``feed`` takes messages in timestamp order, one batch after another,
+    and keeps only counts keyed by gap: the state grows with the number of
+    distinct gaps, not with the chat, so it can live in a checkpoint. The
+    threshold is resolved when the counts are read, as SessionIndex does.
+    """
+
+    def __init__(self, threshold: Optional[float] = None):
+        self.authors: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self.fixed_threshold = threshold
+        self.n = 0
+        self.first_author = -1
+        self._last: Optional[Tuple[int, int]] = None
+        # gap -> messages; (author, gap) -> messages; turns keyed by
+        # (author, previous author, gap)
+        self.gaps: Counter = Counter()
+        self.by_author: Counter = Counter()
+        self.turns: Counter = Counter()
+
+    def feed(self, ts: int, author: str) -> None:
+        a = self._ids.get(author)
+        if a is None:
+            a = self._ids[author] = len(self.authors)
+            self.authors.append(author)
+        if self._last is None:
+            self.first_author = a
+        else:
+            last_ts, last_author = self._last
+            gap = ts - last_ts
+            self.gaps[gap] += 1
+            self.by_author[a, gap] += 1
+            if a != last_author:
+                self.turns[a, last_author, gap] += 1
+        self._last = (ts, a)
+        self.n += 1
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def threshold(self) -> float:
+        if self.fixed_threshold is not None:
+            return self.fixed_threshold
+        if self.n < 2:
+            return 0.0
+        gaps = sorted(self.gaps)
+        ends = np.cumsum([self.gaps[g] for g in gaps])
+        median = gaps[int(np.searchsorted(ends, (self.n - 1) // 2, side="right"))]
+        return float(median) * 3
+
+    def sessions_started(self) -> np.ndarray:
+        threshold = self.threshold
+        out = np.zeros(len(self.authors), dtype=np.int64)
+        if self.n:
+            out[self.first_author] += 1
+        for (a, gap), c in self.by_author.items():
+            if gap > threshold:
+                out[a] += c
+        return out
+
+    def _replies(self):
+        threshold = self.threshold
+        return [(k, c) for k, c in self.turns.items() if k[2] <= threshold]
+
+    def reply_matrix(self) -> np.ndarray:
+        n_authors = len(self.authors)
+        out = np.zeros((n_authors, n_authors), dtype=np.int64)
+        for (a, b, _), c in self._replies():
+            out[a, b] += c
+        return out
+
+    def reply_times(
+        self, percentiles: Sequence[float] = PERCENTILES
+    ) -> np.ndarray:
+        latency: Dict[int, Counter] = {}
+        for (a, _, gap), c in self._replies():
+            latency.setdefault(a, Counter())[gap] += c
+        out = np.full((len(self.authors), len(percentiles)), np.nan)
+        for a, hist in latency.items():
+            values = np.array(sorted(hist), dtype=np.float64)
+            counts = np.array([hist[v] for v in sorted(hist)], dtype=np.int64)
+            out[a] = _percentiles(values, counts, percentiles)
+        return out
+
+
+def build_session_index(msgs, threshold: Optional[float] = None) -> SessionIndex:
+    """SessionIndex of a list of messages or a MessageTable."""
+    if getattr(msgs, "columnar", False):
+        ts, author, authors = msgs.ts, msgs.author_ids, list(msgs.authors)
+    else:
+        ids: Dict[str, int] = {}
+        author = np.fromiter(
+            (ids.setdefault(m.author, len(ids)) for m in msgs),
+            dtype=np.int32,
+            count=len(msgs),
+        )
+        ts = np.fromiter(
+            ((m.ts - EPOCH) // timedelta(seconds=1) for m in msgs),
+            dtype=np.int64,
+            count=len(msgs),
+        )
+        authors = list(ids)
+    if len(ts) > 1 and (ts[1:] < ts[:-1]).any():
+        order = np.argsort(ts, kind="stable")
+        ts, author = ts[order], author[order]
+    return SessionIndex(authors, ts, author, threshold)
+
+
+def session_stats(
+    msgs, index: Optional[Union[SessionIndex, SessionCounts]] = None
+) -> Dict[str, Dict[str, object]]:
+    """Sessions started, reply counts, reply-time percentiles and the
+    authors each one replies to most, per author."""
+    if index is None:
+        index = build_session_index(msgs)
+    if not len(index):
+        return {}
+    started = index.sessions_started()
+    matrix = index.reply_matrix()
+    times = index.reply_times(PERCENTILES) / 60.0
+    authors = index.authors
+
+    def top(row: np.ndarray) -> List[List[object]]:
+        ranked = np.argsort(-row, kind="stable")[:TOP_PARTNERS]
+        return [[authors[b], int(row[b])] for b in ranked if row[b]]
+
+    out: Dict[str, Dict[str, object]] = {}
+    for a, author in enumerate(authors):
+        median, p90 = (
+            None if np.isnan(v) else round(float(v), 1) for v in times[a]
+        )
+        out[author] = {
+            "Sessions started": int(started[a]),
+            "Replies": int(matrix[a].sum()),
+            "Median reply (min)": median,
+            "90th percentile reply (min)": p90,
+            "Replies most to": top(matrix[a]),
+            "Replied to most by": top(matrix[:, a]),
+        }
+    return out
+
+
+def main(argv=None):
+    from chat_parser import parse_chat
+
+    ap = argparse.ArgumentParser(
+        description="Sessions, reply times and who replies to whom."
+    )
+    ap.add_argument("chat")
+    ap.add_argument(
+        "--session-gap",
+        type=float,
+        default=None,
+        metavar="MINUTES",
+        help="silence that ends a session (default: 3x the median gap)",
+    )
+    args = ap.parse_args(argv)
+
+    msgs = parse_chat(args.chat, cache=True)
+    threshold = None if args.session_gap is None else args.session_gap * 60
+    index = build_session_index(msgs, threshold)
+    if not len(index):
+        print("No messages parsed.")
+        return
+    print(
+        f"{len(index):,} messages, {index.n_sessions:,} sessions "
+        f"(a silence over {index.threshold / 60:.1f} min ends one)"
+    )
+    print(
+        f"\n{'author':<24} {'sessions':>8} {'replies':>8} "
+        f"{'p50 min':>8} {'p90 min':>8}"
+    )
+    for author, s in session_stats(msgs, index).items():
+        p50, p90 = (
+            "-" if v is None else f"{v:.1f}"
+            for v in (s["Median reply (min)"], s["90th percentile reply (min)"])
+        )
+        print(
+            f"{author:<24} {s['Sessions started']:>8} {s['Replies']:>8} "
+            f"{p50:>8} {p90:>8}"
+        )
+
+    matrix = index.reply_matrix()
+    width = max(len(a) for a in index.authors[:12])
+    print("\nreplies by row author to column author")
+    print(" " * width + "".join(f" {a[:8]:>8}" for a in index.authors[:12]))
+    for a, row in zip(index.authors[:12], matrix[:12, :12]):
+        print(f"{a:<{width}}" + "".join(f" {int(c):>8}" for c in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,139 +1,310 @@
 # chat_stats.py
 from collections import defaultdict, Counter
-from typing import Dict, List, Tuple
+from datetime import datetime
+from functools import partial
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
+import chat_models
 from chat_parser import Message
-
-
-def basic_stats(msgs: List[Message]) -> Dict[str, Dict[str, float]]:
-    by_author: Dict[str, List[Message]] = defaultdict(list)
-    for m in msgs:
-        by_author[m.author].append(m)
-
-    msgs_sorted = sorted(msgs, key=lambda m: m.ts)
-
-    gaps = [
-        (msgs_sorted[i + 1].ts - msgs_sorted[i].ts).total_seconds()
-        for i in range(len(msgs_sorted) - 1)
-    ]
-    median_gap = sorted(gaps)[len(gaps) // 2] if gaps else 0
+from chat_sentiment import SentimentScores
+from chat_tokens import COMMON_STOP, WORD_RE, TokenizedCorpus, tokenize_corpus
+
+
+def _kth(counts: Counter, k: int) -> float:
+    """k-th smallest (0-based) of the values counted in ``counts``."""
+    for v in sorted(counts):
+        k -= counts[v]
+        if k < 0:
+            return v
+    raise IndexError(k)
+
+
+def _reiterable(msgs: Iterable[Message]):
+    """``msgs`` as something that can be looped over more than once."""
+    return list(msgs) if isinstance(msgs, Iterator) else msgs
+
+
+class _AuthorState:
+    __slots__ = (
+        "count", "words", "first", "last", "silences", "max_streak", "hours",
+    )
+
+    def __init__(self, ts: datetime):
+        self.count = 0
+        self.words = 0
+        self.first = ts
+        self.last: Optional[datetime] = None
+        # seconds since this author's previous message -> occurrences
+        self.silences: Counter = Counter()
+        self.max_streak = 1
+        self.hours = [0] * 24
+
+
+class BasicStatsEngine:
+    """Computes basic_stats for every author in one sweep.
+
+    Messages must be fed in timestamp order. Streaks, silences, active
+    span and hourly counts are updated per message; the global median gap
+    needed for "Mid-conversation exits" is resolved in ``result``. Gaps
+    and silences are kept as histograms, so the state grows with the
+    number of distinct gaps rather than with the chat.
+    """
+
+    def __init__(self):
+        self.gaps: Counter = Counter()
+        self.authors: Dict[str, _AuthorState] = {}
+        self._last_ts: Optional[datetime] = None
+        self._run_author: Optional[str] = None
+        self._run = 0
+
+    def feed(self, m: Message) -> None:
+        ts = m.ts
+        if self._last_ts is not None:
+            if ts < self._last_ts:
+                raise ValueError("messages are not in timestamp order")
+            self.gaps[(ts - self._last_ts).total_seconds()] += 1
+        self._last_ts = ts
+
+        st = self.authors.get(m.author)
+        if st is None:
+            st = self.authors[m.author] = _AuthorState(ts)
+        if st.last is not None:
+            st.silences[(ts - st.last).total_seconds()] += 1
+        st.last = ts
+        st.count += 1
+        st.words += len(m.text.split())
+        st.hours[ts.hour] += 1
+
+        if m.author == self._run_author:
+            self._run += 1
+        else:
+            self._run_author = m.author
+            self._run = 1
+        if self._run > st.max_streak:
+            st.max_streak = self._run
+
+    def result(
+        self, order: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, float]]:
+        gaps = self.gaps
+        median_gap = _kth(gaps, sum(gaps.values()) // 2) if gaps else 0
+        threshold = median_gap * 3
+
+        out: Dict[str, Dict[str, float]] = {}
+        for author in order if order is not None else self.authors:
+            st = self.authors[author]
+            hour_counts = st.hours
+            peak_hour = hour_counts.index(max(hour_counts))
+
+            out[author] = {
+                "Total messages": float(st.count),
+                "Average words per message": round(st.words / st.count, 2),
+                "Longest silence (days)": round(
+                    max(st.silences, default=0) / 86400.0, 2
+                ),
+                "Longest streak (messages)": float(st.max_streak),
+                "Mid-conversation exits": float(
+                    sum(c for g, c in st.silences.items() if g > threshold)
+                ),
+                "Active span (days)": round(
+                    (st.last - st.first).total_seconds() / 86400.0, 2
+                ),
+                "Peak message hour": float(peak_hour),
+                "Hourly activity": [
+                    round(c / st.count, 3) for c in hour_counts
+                ],
+            }
+
+        return out
+
+
+def _basic_stats_table(table, index=None) -> Dict[str, Dict[str, float]]:
+    import numpy as np
+
+    from chat_sessions import build_session_index
+
+    if not len(table):
+        return {}
+    if index is None:
+        index = build_session_index(table)
+    n_authors = len(table.authors)
+    ts = index.ts
+    aid = index.author
+
+    counts = np.bincount(aid, minlength=n_authors)
+    words = np.bincount(
+        table.author_ids, weights=table.n_words, minlength=n_authors
+    )
+    hours = np.bincount(
+        aid * 24 + (ts // 3600) % 24, minlength=n_authors * 24
+    ).reshape(n_authors, 24)
+
+    # runs of consecutive messages by the same author
+    run_starts = np.flatnonzero(index.turn)
+    run_lengths = np.diff(np.r_[run_starts, len(aid)])
+    max_streak = np.ones(n_authors, dtype=np.int64)
+    np.maximum.at(max_streak, aid[run_starts], run_lengths)
+
+    silence_author, silences = index.silences()
+    longest = np.zeros(n_authors)
+    np.maximum.at(longest, silence_author, silences)
+    exits = index.exits()
+    first = np.full(n_authors, np.iinfo(np.int64).max)
+    last = np.full(n_authors, np.iinfo(np.int64).min)
+    np.minimum.at(first, aid, ts)
+    np.maximum.at(last, aid, ts)
 
     out: Dict[str, Dict[str, float]] = {}
-
-    for author, lst in by_author.items():
-        lst_sorted = sorted(lst, key=lambda m: m.ts)
-        times = [m.ts for m in lst_sorted]
-
-        silences = [
-            (times[i + 1] - times[i]).total_seconds()
-            for i in range(len(times) - 1)
-        ]
-
-        word_counts = [len(m.text.split()) for m in lst_sorted]
-
-        streak = 1
-        max_streak = 1
-        for i in range(1, len(msgs_sorted)):
-            if (
-                msgs_sorted[i].author == author
-                and msgs_sorted[i - 1].author == author
-            ):
-                streak += 1
-            else:
-                max_streak = max(max_streak, streak)
-                streak = 1
-        max_streak = max(max_streak, streak)
-
-        longest_silence_days = (
-            max(silences, default=0) / 86400.0
-        ) if silences else 0.0
-        active_span_days = (
-            (max(times) - min(times)).total_seconds() / 86400.0
-            if times
-            else 0.0
-        )
-
-        hour_counts = [0] * 24
-        for t in times:
-            hour_counts[t.hour] += 1
-        total_msgs = sum(hour_counts)
-        peak_hour = hour_counts.index(max(hour_counts)) if hour_counts and total_msgs > 0 else 0
-        normalized_hours = [round(c / total_msgs, 3) for c in hour_counts] if total_msgs > 0 else [0] * 24
-
+    for a, author in enumerate(table.authors):
+        n = int(counts[a])
+        hour_counts = hours[a].tolist()
         out[author] = {
-            "Total messages": float(len(lst_sorted)),
-            "Average words per message": round(
-                sum(word_counts) / len(word_counts), 2
-            )
-            if word_counts
-            else 0.0,
-            "Longest silence (days)": round(longest_silence_days, 2),
-            "Longest streak (messages)": float(max_streak),
-            "Mid-conversation exits": float(
-                sum(1 for g in silences if g > median_gap * 3)
+            "Total messages": float(n),
+            "Average words per message": round(int(words[a]) / n, 2),
+            "Longest silence (days)": round(float(longest[a]) / 86400.0, 2),
+            "Longest streak (messages)": float(max_streak[a]),
+            "Mid-conversation exits": float(exits[a]),
+            "Active span (days)": round(
+                float(last[a] - first[a]) / 86400.0, 2
             ),
-            "Active span (days)": round(active_span_days, 2),
-            "Peak message hour": float(peak_hour),
-            "Hourly activity": normalized_hours,
+            "Peak message hour": float(hour_counts.index(max(hour_counts))),
+            "Hourly activity": [round(c / n, 3) for c in hour_counts],
         }
 
     return out
 
 
-def daily_activity(msgs: List[Message]) -> Dict[str, Dict[str, int]]:
-    by: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
-    for m in msgs:
-        day = m.ts.date().isoformat()
-        by[m.author][day] += 1
+def basic_stats(
+    msgs: Iterable[Message], index=None
+) -> Dict[str, Dict[str, float]]:
+    """Per-author totals, streaks, silences and hourly activity.
+
+    A MessageTable is handled with array operations, reusing the
+    chat_sessions.SessionIndex ``index`` when one is given.
+    """
+    if getattr(msgs, "columnar", False):
+        return _basic_stats_table(msgs, index)
+
+    if isinstance(msgs, Iterator):
+        # a stream (e.g. iter_chat) is consumed as-is; exports are written
+        # in chronological order
+        engine = BasicStatsEngine()
+        for m in msgs:
+            engine.feed(m)
+        return engine.result()
+
+    order = list(dict.fromkeys(m.author for m in msgs))
+    engine = BasicStatsEngine()
+    for m in sorted(msgs, key=lambda m: m.ts):
+        engine.feed(m)
+    return engine.result(order)
+
+
+def _daily_activity_table(table) -> Dict[str, Dict[str, int]]:
+    import numpy as np
+
+    days, day_idx = np.unique(table.day_index(), return_inverse=True)
+    labels = [table.day_iso(d) for d in days]
+    grid = np.bincount(
+        table.author_ids.astype(np.int64) * len(days) + day_idx.ravel(),
+        minlength=len(table.authors) * len(days),
+    ).reshape(len(table.authors), len(days))
+
+    by: Dict[str, Dict[str, int]] = defaultdict(partial(defaultdict, int))
+    for a, d in zip(*np.nonzero(grid)):
+        by[table.authors[a]][labels[d]] = int(grid[a, d])
     return by
 
 
-COMMON_STOP = {
-    "the","and","a","an","to","of","in","on","for","with","at","by","from",
-    "is","am","are","was","were","be","been","being","do","does","did",
-    "have","has","had","will","would","can","could","should","shall","may",
-    "you","u","ur","i","im","i'm","me","my","mine","we","our","ours",
-    "he","she","it","they","them","their","theirs","his","her","hers",
-    "this","that","these","those","here","there","then","than",
-    "so","but","or","if","as","because","when","while","what","which","who",
-    "how","why","gon","na","yh","cld",
-    "like","really","just","literally","kinda","sorta","maybe","probably",
-    "thing","things","stuff","okay","ok","yeah","yep","nope",
-}
+def daily_activity(msgs: Iterable[Message]) -> Dict[str, Dict[str, int]]:
+    if getattr(msgs, "columnar", False):
+        return _daily_activity_table(msgs)
 
+    by: Dict[str, Dict[str, int]] = defaultdict(partial(defaultdict, int))
+    accumulate_daily(by, msgs)
+    return by
 
 
-def word_frequencies(msgs: List[Message]) -> Dict[str, Counter]:
-    import re
+def accumulate_daily(
+    by: Dict[str, Dict[str, int]], msgs: Iterable[Message]
+) -> None:
+    for m in msgs:
+        day = m.ts.date().isoformat()
+        by[m.author][day] += 1
 
-    by: Dict[str, Counter] = defaultdict(Counter)
 
+def accumulate_heatmap(by: Dict[str, Counter], msgs: Iterable[Message]) -> None:
     for m in msgs:
-        words = re.findall(r"[A-Za-z']+", m.text.lower())
-        words = [w for w in words if w not in COMMON_STOP]
-        by[m.author].update(words)
+        by[m.author][m.ts.weekday() * 24 + m.ts.hour] += 1
+
+
+def heatmap_result(by: Dict[str, Counter]) -> Dict[str, List[List[int]]]:
+    """Weekday (Monday first) x hour grids, as RollupCube.heatmaps gives."""
+    return {
+        author: [[cells[w * 24 + h] for h in range(24)] for w in range(7)]
+        for author, cells in by.items()
+    }
+
+
+def word_frequencies(
+    msgs: Iterable[Message],
+    corpus: Optional[TokenizedCorpus] = None,
+    approx: Optional[int] = None,
+) -> Dict[str, Counter]:
+    """Word counts per author.
+
+    With ``approx=m`` each author gets a chat_topk.SpaceSaving summary of
+    at most ``m`` words instead of a Counter, and counts are exact up to
+    ``n / m`` for an author with ``n`` words. Without a ``corpus`` the
+    words are streamed from each message's text into the summaries, so
+    memory stays O(authors x m).
+    """
+    if approx is not None:
+        from chat_topk import SpaceSaving
+
+        by = defaultdict(partial(SpaceSaving, approx))
+    else:
+        by = defaultdict(Counter)
+
+    if corpus is None:
+        for m in msgs:
+            words = WORD_RE.findall(m.text.lower())
+            by[m.author].update(w for w in words if w not in COMMON_STOP)
+        return by
+
+    for i, m in enumerate(msgs):
+        by[m.author].update(corpus.words(i))
 
     return by
 
 
-def sentiment_scores(msgs: List[Message]) -> Dict[str, Dict[str, float]]:
-    from nltk.sentiment import SentimentIntensityAnalyzer
-
-    sia = SentimentIntensityAnalyzer()
-    sums = defaultdict(lambda: defaultdict(float))
+def sentiment_scores(
+    msgs: Iterable[Message], sentiment: Optional[SentimentScores] = None
+) -> Dict[str, Dict[str, float]]:
+    if sentiment is None:
+        sentiment = SentimentScores()
+    sums = defaultdict(partial(defaultdict, float))
     counts = defaultdict(int)
+    accumulate_sentiment(sums, counts, msgs, sentiment)
+    return sentiment_result(sums, counts)
+
 
+def accumulate_sentiment(
+    sums, counts, msgs: Iterable[Message], sentiment: SentimentScores
+) -> None:
     for m in msgs:
         txt = m.text.strip()
         if not txt:
             continue
-        vs = sia.polarity_scores(txt)
+        vs = sentiment.polarity(txt)
         sums[m.author]["Happiness"] += vs["pos"]
         sums[m.author]["Sadness"] += vs["neg"]
         sums[m.author]["Anger"] += vs["neg"]
         sums[m.author]["Overall"] += vs["compound"]
         counts[m.author] += 1
 
+
+def sentiment_result(sums, counts) -> Dict[str, Dict[str, float]]:
     out = {}
     for author, comp in sums.items():
         n = counts[author] or 1
@@ -144,23 +315,31 @@ def sentiment_scores(msgs: List[Message]) -> Dict[str, Dict[str, float]]:
     return out
 
 
-
-def confrontational_index(msgs: List[Message]) -> Dict[str, float]:
-    from nltk.sentiment import SentimentIntensityAnalyzer
-
-    sia = SentimentIntensityAnalyzer()
+def confrontational_index(
+    msgs: Iterable[Message], sentiment: Optional[SentimentScores] = None
+) -> Dict[str, float]:
+    if sentiment is None:
+        sentiment = SentimentScores()
     sums = defaultdict(float)
     counts = defaultdict(int)
+    accumulate_confront(sums, counts, msgs, sentiment)
+    return confront_result(sums, counts)
 
+
+def accumulate_confront(
+    sums, counts, msgs: Iterable[Message], sentiment: SentimentScores
+) -> None:
     for m in msgs:
         txt = m.text.strip()
         if not txt:
             continue
-        vs = sia.polarity_scores(txt)
+        vs = sentiment.polarity(txt)
         negative_intensity = max(vs["neg"], -vs["compound"])
         sums[m.author] += negative_intensity
         counts[m.author] += 1
 
+
+def confront_result(sums, counts) -> Dict[str, float]:
     out = {}
     for author, total in sums.items():
         n = counts[author] or 1
@@ -168,100 +347,102 @@ def confrontational_index(msgs: List[Message]) -> Dict[str, float]:
     return out
 
 
-def pos_stats(msgs: List[Message], top_k: int = 10) -> Dict[str, Dict[str, List[str]]]:
-    import re
-    import nltk
-    from nltk.corpus import stopwords
+def pos_stats(
+    msgs: Iterable[Message],
+    top_k: int = 10,
+    corpus: Optional[TokenizedCorpus] = None,
+    fast: bool = False,
+    tag_cache: Optional[str] = None,
+) -> Dict[str, Dict[str, List[str]]]:
+    """Top nouns, verbs and adjectives per author.
 
-    all_words = Counter()
-    nltk_stopwords = set(stopwords.words('english'))
-
-    for m in msgs:
-        txt = m.text.strip()
-        if not txt:
-            continue
-        words = re.findall(r"[A-Za-z']+", txt.lower())
-        words = [w for w in words if w not in COMMON_STOP and w not in nltk_stopwords]
-        all_words.update(words)
-
-    global_high_freq = set([w for w, c in all_words.most_common(100)])
+    ``fast=True`` tags each word type once instead of every token (see
+    chat_pos), optionally through the persistent ``tag_cache`` file.
+    """
+    msgs = _reiterable(msgs)
+    if corpus is None or not corpus.has_pos:
+        corpus = tokenize_corpus(msgs)
 
     by_author_tokens = defaultdict(list)
 
-    for m in msgs:
-        txt = m.text.strip()
-        if not txt:
-            continue
-        tokens = nltk.word_tokenize(txt)
-        tokens = [t.lower() for t in tokens if t.isalpha()]
-        tokens = [t for t in tokens if t not in COMMON_STOP and t not in nltk_stopwords and t not in global_high_freq]
-        by_author_tokens[m.author].extend(tokens)
+    for i, m in enumerate(msgs):
+        by_author_tokens[m.author].extend(corpus.pos_words(i, corpus.high_freq))
 
     out: Dict[str, Dict[str, List[str]]] = {}
 
-    for author, tokens in by_author_tokens.items():
-        tagged = nltk.pos_tag(tokens)
-        nouns = Counter()
-        verbs = Counter()
-        adjs = Counter()
-
-        for word, tag in tagged:
-            if tag.startswith("NN"):
-                nouns[word] += 1
-            elif tag.startswith("VB"):
-                verbs[word] += 1
-            elif tag.startswith("JJ"):
-                adjs[word] += 1
+    if fast:
+        from chat_pos import tag_types
 
-        out[author] = {
-            "nouns": [w for w, _ in nouns.most_common(top_k)],
-            "verbs": [w for w, _ in verbs.most_common(top_k)],
-            "adjectives": [w for w, _ in adjs.most_common(top_k)],
-        }
+        tags = tag_types(by_author_tokens.values(), cache_path=tag_cache)
+        for author, tokens in by_author_tokens.items():
+            counts = Counter(tokens)
+            out[author] = pos_top(
+                (((w, tags[w]), c) for w, c in counts.items()), top_k
+            )
+        return out
+
+    tagger = chat_models.tagger()
+    for author, tokens in by_author_tokens.items():
+        tagged = tagger.tag(tokens)
+        out[author] = pos_top(Counter(tagged).items(), top_k)
 
     return out
 
 
-def words_not_to_say(
-    msgs: List[Message], min_total: float = 0.5
-) -> Dict[str, List[str]]:
-    import re
-    import nltk
-    from nltk.corpus import stopwords
-    from nltk.sentiment import SentimentIntensityAnalyzer
+def pos_top(tag_counts, top_k: int) -> Dict[str, List[str]]:
+    """Top nouns/verbs/adjectives from ((word, tag), count) pairs."""
+    nouns = Counter()
+    verbs = Counter()
+    adjs = Counter()
 
-    sia = SentimentIntensityAnalyzer()
-    nltk_stopwords = set(stopwords.words('english'))
+    for (word, tag), c in tag_counts:
+        if tag.startswith("NN"):
+            nouns[word] += c
+        elif tag.startswith("VB"):
+            verbs[word] += c
+        elif tag.startswith("JJ"):
+            adjs[word] += c
+
+    return {
+        "nouns": [w for w, _ in nouns.most_common(top_k)],
+        "verbs": [w for w, _ in verbs.most_common(top_k)],
+        "adjectives": [w for w, _ in adjs.most_common(top_k)],
+    }
 
-    all_words = Counter()
-    for m in msgs:
-        txt = m.text.strip()
-        if not txt:
-            continue
-        words = re.findall(r"[A-Za-z']+", txt.lower())
-        words = [w for w in words if w not in COMMON_STOP and w not in nltk_stopwords]
-        all_words.update(words)
 
-    global_high_freq = set([w for w, c in all_words.most_common(100)])
+def words_not_to_say(
+    msgs: Iterable[Message],
+    min_total: float = 0.5,
+    sentiment: Optional[SentimentScores] = None,
+    corpus: Optional[TokenizedCorpus] = None,
+) -> Dict[str, List[str]]:
+    msgs = _reiterable(msgs)
+    if sentiment is None:
+        sentiment = SentimentScores()
+    if corpus is None:
+        corpus = tokenize_corpus(msgs, with_pos=False)
 
-    word_scores = defaultdict(lambda: defaultdict(float))
+    word_scores = defaultdict(partial(defaultdict, float))
 
-    for m in msgs:
-        txt = m.text.lower().strip()
+    for i, m in enumerate(msgs):
+        txt = m.text.strip()
         if not txt:
             continue
-        vs = sia.polarity_scores(txt)
+        vs = sentiment.polarity(txt)
         neg_score = max(vs["neg"], -vs["compound"])
         if neg_score <= 0:
             continue
-        words = re.findall(r"[A-Za-z']+", txt)
-        words = [w for w in words if w not in COMMON_STOP and w not in nltk_stopwords and w not in global_high_freq]
+        words = corpus.content_words(i)
         if not words:
             continue
         per_word = neg_score / len(words)
         for w in words:
             word_scores[m.author][w] += per_word
 
+    return bad_words_result(word_scores, min_total)
+
+
+def bad_words_result(word_scores, min_total: float) -> Dict[str, List[str]]:
     out: Dict[str, List[str]] = {}
     for author, scores in word_scores.items():
         filtered = {w: s for w, s in scores.items() if s >= min_total}
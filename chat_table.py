@@ -0,0 +1,229 @@
+# chat_table.py
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+import chat_profile
+from chat_parser import (
+    FORMATS,
+    Message,
+    detect_chat_format,
+    iter_chat,
+    iter_range,
+    parallel_ranges,
+)
+
+EPOCH = datetime(1970, 1, 1)
+_CHUNK = 65536
+
+
+class MessageTable:
+    """Parsed messages stored column-wise.
+
+    Timestamps are int64 seconds since 1970-01-01 (naive, like
+    ``Message.ts``), authors are interned into ``authors`` and referenced by
+    int32 id, and all texts live in one UTF-8 buffer sliced by
+    ``text_offsets``. Iterating or indexing yields ``Message`` views, so
+    code written for ``List[Message]`` keeps working; slicing yields a
+    table sharing this one's arrays (see rows). ``chat_format`` is
+    the name of the detected export format, as on ``ChatLog``.
+    """
+
+    columnar = True
+
+    def __init__(
+        self,
+        ts: np.ndarray,
+        author_ids: np.ndarray,
+        authors: List[str],
+        text_buf: bytes,
+        text_offsets: np.ndarray,
+        n_words: np.ndarray,
+        chat_format: str = "",
+    ):
+        self.ts = ts
+        self.author_ids = author_ids
+        self.authors = authors
+        self.text_buf = text_buf
+        self.text_offsets = text_offsets
+        self.n_words = n_words
+        self.chat_format = chat_format
+
+    @classmethod
+    def from_messages(
+        cls, msgs: Iterable[Message], chat_format: Optional[str] = None
+    ) -> "MessageTable":
+        if chat_format is None:
+            chat_format = getattr(msgs, "chat_format", "")
+        ts = array("q")
+        author_ids = array("i")
+        n_words = array("i")
+        offsets = array("q", [0])
+        buf = bytearray()
+        index = {}
+        authors: List[str] = []
+
+        for m in msgs:
+            a = index.get(m.author)
+            if a is None:
+                a = index[m.author] = len(authors)
+                authors.append(m.author)
+            ts.append((m.ts - EPOCH) // timedelta(seconds=1))
+            author_ids.append(a)
+            n_words.append(len(m.text.split()))
+            buf += m.text.encode("utf8")
+            offsets.append(len(buf))
+
+        return cls(
+            ts=np.frombuffer(ts, dtype=np.int64),
+            author_ids=np.frombuffer(author_ids, dtype=np.int32),
+            authors=authors,
+            text_buf=bytes(buf),
+            text_offsets=np.frombuffer(offsets, dtype=np.int64),
+            n_words=np.frombuffer(n_words, dtype=np.int32),
+            chat_format=chat_format,
+        )
+
+    @classmethod
+    def concat(cls, tables: Sequence["MessageTable"]) -> "MessageTable":
+        index = {}
+        authors: List[str] = []
+        author_ids = []
+        offsets = [np.zeros(1, dtype=np.int64)]
+        base = 0
+        for t in tables:
+            remap = np.empty(len(t.authors), dtype=np.int32)
+            for a, name in enumerate(t.authors):
+                g = index.get(name)
+                if g is None:
+                    g = index[name] = len(authors)
+                    authors.append(name)
+                remap[a] = g
+            author_ids.append(remap[t.author_ids])
+            offsets.append(t.text_offsets[1:] + base)
+            base += len(t.text_buf)
+
+        return cls(
+            ts=np.concatenate([t.ts for t in tables]),
+            author_ids=np.concatenate(author_ids),
+            authors=authors,
+            text_buf=b"".join(t.text_buf for t in tables),
+            text_offsets=np.concatenate(offsets),
+            n_words=np.concatenate([t.n_words for t in tables]),
+            chat_format=tables[0].chat_format if tables else "",
+        )
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def text(self, i: int) -> str:
+        lo, hi = self.text_offsets[i], self.text_offsets[i + 1]
+        return self.text_buf[lo:hi].decode("utf8")
+
+    def __getitem__(self, i):
+        """A Message view, or for a slice the rows() table it covers."""
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                raise TypeError("MessageTable slices must have step 1")
+            return self.rows(start, max(start, stop))
+        if i < 0:
+            i += len(self)
+        return Message(
+            ts=EPOCH + timedelta(seconds=int(self.ts[i])),
+            author=self.authors[self.author_ids[i]],
+            text=self.text(i),
+        )
+
+    def __iter__(self) -> Iterator[Message]:
+        buf = self.text_buf
+        authors = self.authors
+        for start in range(0, len(self), _CHUNK):
+            stop = min(start + _CHUNK, len(self))
+            offsets = self.text_offsets[start:stop + 1].tolist()
+            for k, (secs, a) in enumerate(zip(
+                self.ts[start:stop].tolist(),
+                self.author_ids[start:stop].tolist(),
+            )):
+                yield Message(
+                    ts=EPOCH + timedelta(seconds=secs),
+                    author=authors[a],
+                    text=buf[offsets[k]:offsets[k + 1]].decode("utf8"),
+                )
+
+    def to_messages(self) -> List[Message]:
+        return list(self)
+
+    def rows(self, start: int, stop: int) -> "MessageTable":
+        """Messages ``start:stop`` as a table sharing this one's text buffer.
+
+        Authors without a message in the range are dropped; the rest are
+        numbered in order of first appearance, as a fresh parse would.
+        """
+        ids = self.author_ids[start:stop]
+        present, first_row = np.unique(ids, return_index=True)
+        order = present[np.argsort(first_row)]
+        remap = np.zeros(len(self.authors), dtype=np.int32)
+        remap[order] = np.arange(len(order), dtype=np.int32)
+        return MessageTable(
+            ts=self.ts[start:stop],
+            author_ids=remap[ids],
+            authors=[self.authors[a] for a in order.tolist()],
+            text_buf=self.text_buf,
+            text_offsets=self.text_offsets[start:stop + 1],
+            n_words=self.n_words[start:stop],
+            chat_format=self.chat_format,
+        )
+
+    def date_rows(
+        self, first: Optional[date] = None, last: Optional[date] = None
+    ) -> Tuple[int, int]:
+        """Row range of the messages dated ``first``..``last`` inclusive.
+
+        ``ts`` must be sorted, as it is for any chronological export.
+        """
+        epoch = EPOCH.date()
+        lo = 0 if first is None else int(np.searchsorted(
+            self.ts, (first - epoch).days * 86400, side="left"
+        ))
+        hi = len(self) if last is None else int(np.searchsorted(
+            self.ts, ((last - epoch).days + 1) * 86400, side="left"
+        ))
+        return lo, max(lo, hi)
+
+    def day_index(self) -> np.ndarray:
+        return self.ts // 86400
+
+    def hour_of_day(self) -> np.ndarray:
+        return (self.ts // 3600) % 24
+
+    @staticmethod
+    def day_iso(day: int) -> str:
+        return (EPOCH + timedelta(days=int(day))).date().isoformat()
+
+
+def _table_range(args: Tuple[str, int, int, str]) -> MessageTable:
+    path, start, end, fmt_name = args
+    return MessageTable.from_messages(
+        iter_range(path, start, end, FORMATS[fmt_name]), fmt_name
+    )
+
+
+def load_table(path: str, workers: Optional[int] = None) -> MessageTable:
+    """Parse an export straight into a MessageTable.
+
+    Small files are streamed through iter_chat; exports of at least
+    ``PARALLEL_MIN_BYTES`` are split like parse_chat does and each worker
+    ships back a compact table for its range instead of Message objects.
+    """
+    fmt = detect_chat_format(path)
+    with chat_profile.span("parse") as sp:
+        parts = parallel_ranges(path, workers, _table_range, fmt)
+        if parts is not None:
+            table = MessageTable.concat(parts)
+        else:
+            table = MessageTable.from_messages(iter_chat(path, fmt), fmt.name)
+        sp.count(len(table))
+    return table
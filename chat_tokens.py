@@ -0,0 +1,156 @@
+# chat_tokens.py
+import re
+from array import array
+from dataclasses import dataclass
+from typing import FrozenSet, Iterable, List, Optional, Set
+
+import chat_models
+from chat_parser import Message
+
+WORD_RE = re.compile(r"[A-Za-z']+")
+
+COMMON_STOP = {
+    "the","and","a","an","to","of","in","on","for","with","at","by","from",
+    "is","am","are","was","were","be","been","being","do","does","did",
+    "have","has","had","will","would","can","could","should","shall","may",
+    "you","u","ur","i","im","i'm","me","my","mine","we","our","ours",
+    "he","she","it","they","them","their","theirs","his","her","hers",
+    "this","that","these","those","here","there","then","than",
+    "so","but","or","if","as","because","when","while","what","which","who",
+    "how","why","gon","na","yh","cld",
+    "like","really","just","literally","kinda","sorta","maybe","probably",
+    "thing","things","stuff","okay","ok","yeah","yep","nope",
+}
+
+@dataclass
+class TokenizedCorpus:
+    """Every message tokenized once, as ids into a shared vocabulary.
+
+    Tokens of message ``i`` are ``ids[offsets[i]:offsets[i + 1]]``; the
+    masks are indexed by token id. ``pos_ids``/``pos_offsets`` hold the
+    same for the word_tokenize tokens pos_stats tags, when requested.
+    """
+
+    vocab: List[str]
+    ids: array
+    offsets: array
+    common_stop: bytearray
+    nltk_stop: bytearray
+    high_freq: bytearray
+    non_stop: bytearray
+    non_content: bytearray
+    nltk_stopwords: FrozenSet[str]
+    pos_ids: Optional[array] = None
+    pos_offsets: Optional[array] = None
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def global_high_freq(self) -> Set[str]:
+        return {w for w, hf in zip(self.vocab, self.high_freq) if hf}
+
+    @property
+    def has_pos(self) -> bool:
+        return self.pos_offsets is not None
+
+    def _select(
+        self, i: int, drop: bytearray, ids=None, offsets=None
+    ) -> List[str]:
+        if ids is None:
+            ids, offsets = self.ids, self.offsets
+        vocab = self.vocab
+        return [vocab[t] for t in ids[offsets[i]:offsets[i + 1]] if not drop[t]]
+
+    def words(self, i: int) -> List[str]:
+        """Tokens of message ``i`` minus COMMON_STOP."""
+        return self._select(i, self.common_stop)
+
+    def nonstop_words(self, i: int) -> List[str]:
+        """Tokens of message ``i`` minus both stopword lists."""
+        return self._select(i, self.non_stop)
+
+    def content_words(self, i: int) -> List[str]:
+        """Tokens of message ``i`` minus both stopword lists and the
+        global high-frequency words."""
+        return self._select(i, self.non_content)
+
+    def pos_words(self, i: int, drop: Optional[bytearray] = None) -> List[str]:
+        """word_tokenize tokens of message ``i``: alphabetic, lowercased,
+        minus both stopword lists and any token id set in ``drop``."""
+        if drop is None:
+            drop = bytearray(len(self.vocab))
+        return self._select(i, drop, self.pos_ids, self.pos_offsets)
+
+
+def tokenize_corpus(
+    msgs: Iterable[Message], high_freq_k: int = 100, with_pos: bool = True
+) -> TokenizedCorpus:
+    """Tokenize ``msgs`` once for every word analysis.
+
+    ``with_pos=False`` skips the (slow) word_tokenize pass only pos_stats
+    needs.
+    """
+    stop_nltk = chat_models.stopwords()
+
+    index = {}
+    vocab: List[str] = []
+    ids = array("i")
+    offsets = array("q", [0])
+    pos_ids = array("i") if with_pos else None
+    pos_offsets = array("q", [0]) if with_pos else None
+
+    def token_id(w: str) -> int:
+        t = index.get(w)
+        if t is None:
+            t = index[w] = len(vocab)
+            vocab.append(w)
+        return t
+
+    for m in msgs:
+        for w in WORD_RE.findall(m.text.lower()):
+            ids.append(token_id(w))
+        offsets.append(len(ids))
+        if with_pos:
+            txt = m.text.strip()
+            if txt:
+                for tok in chat_models.word_tokenize(txt):
+                    if not tok.isalpha():
+                        continue
+                    tok = tok.lower()
+                    if tok not in COMMON_STOP and tok not in stop_nltk:
+                        pos_ids.append(token_id(tok))
+            pos_offsets.append(len(pos_ids))
+
+    common_mask = bytearray(w in COMMON_STOP for w in vocab)
+    nltk_mask = bytearray(w in stop_nltk for w in vocab)
+
+    # same ordering as Counter.most_common: by count, ties by first use
+    counts = [0] * len(vocab)
+    for t in ids:
+        counts[t] += 1
+    # POS-only tokens have no count and never rank
+    candidates = [
+        t for t in range(len(vocab))
+        if counts[t] and not common_mask[t] and not nltk_mask[t]
+    ]
+    candidates.sort(key=lambda t: -counts[t])
+    high_mask = bytearray(len(vocab))
+    for t in candidates[:high_freq_k]:
+        high_mask[t] = 1
+
+    return TokenizedCorpus(
+        vocab=vocab,
+        ids=ids,
+        offsets=offsets,
+        common_stop=common_mask,
+        nltk_stop=nltk_mask,
+        high_freq=high_mask,
+        non_stop=bytearray(c | n for c, n in zip(common_mask, nltk_mask)),
+        non_content=bytearray(
+            c | n | h for c, n, h in zip(common_mask, nltk_mask, high_mask)
+        ),
+        nltk_stopwords=stop_nltk,
+        pos_ids=pos_ids,
+        pos_offsets=pos_offsets,
+    )
@@ -0,0 +1,155 @@
+# chat_topk.py
+"""Approximate top-k word counts in bounded memory (Space-Saving).
+
+A SpaceSaving summary monitors at most ``capacity`` words. A new word
+evicts the least-counted one and inherits its count, so counts are
+overestimated and never underestimated. After ``n`` words in total:
+
+* every reported count is at most ``bound() <= n / capacity`` above the
+  true count, and ``error(word)`` bounds the overestimate per word;
+* every word that occurs more than ``n / capacity`` times is monitored;
+* a word is certainly in the true top k if its count minus its error is
+  at least the (k+1)-th reported count.
+
+Compare against the exact counts with:
+
+    python chat_topk.py chat.txt --capacity 200 --top 10
+"""
+import argparse
+from collections import Counter
+from collections.abc import Mapping
+from heapq import heappush, heapreplace
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_CAPACITY = 1000
+
+
+class SpaceSaving(Mapping):
+    """Heavy-hitters summary behaving like a read-only Counter."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.n = 0
+        self._counts: Dict[Hashable, int] = {}
+        self._errors: Dict[Hashable, int] = {}
+        # one (count, item) per monitored item; counts may lag behind
+        # _counts and are refreshed only when the entry reaches the top
+        self._heap: List[Tuple[int, Hashable]] = []
+
+    def add(self, item: Hashable, k: int = 1) -> None:
+        self.n += k
+        counts = self._counts
+        c = counts.get(item)
+        if c is not None:
+            counts[item] = c + k
+            return
+        if len(counts) < self.capacity:
+            counts[item] = k
+            self._errors[item] = 0
+            heappush(self._heap, (k, item))
+            return
+
+        heap = self._heap
+        while True:
+            low, victim = heap[0]
+            actual = counts[victim]
+            if actual == low:
+                break
+            heapreplace(heap, (actual, victim))
+        heapreplace(heap, (low + k, item))
+        del counts[victim], self._errors[victim]
+        counts[item] = low + k
+        self._errors[item] = low
+
+    def update(self, items: Iterable[Hashable]) -> None:
+        add = self.add
+        for item in items:
+            add(item)
+
+    def error(self, item: Hashable) -> int:
+        """Upper bound on how far ``self[item]`` overestimates."""
+        return self._errors.get(item, 0)
+
+    def bound(self) -> int:
+        """Upper bound on the overestimate of any count.
+
+        Zero until a word has been evicted, then the smallest monitored
+        count, which never exceeds ``n / capacity``.
+        """
+        if len(self._counts) < self.capacity:
+            return 0
+        return min(self._counts.values())
+
+    def most_common(self, k: Optional[int] = None) -> List[Tuple[Hashable, int]]:
+        ranked = sorted(self._counts.items(), key=lambda kv: -kv[1])
+        return ranked if k is None else ranked[:k]
+
+    def guaranteed(self, k: int) -> List[Tuple[Hashable, int]]:
+        """The reported top ``k`` entries that are certainly in the true top k."""
+        ranked = self.most_common(k + 1)
+        if len(ranked) > k:
+            floor = ranked[k][1]
+        else:
+            # an evicted word may have been counted up to the smallest count
+            floor = self.bound()
+        return [(w, c) for w, c in ranked[:k] if c - self._errors[w] >= floor]
+
+    def __getitem__(self, item: Hashable) -> int:
+        return self._counts[item]
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._counts)
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+
+def compare_topk(exact: Counter, approx: SpaceSaving, k: int = 10) -> dict:
+    """How well ``approx`` recovers the top ``k`` of ``exact``."""
+    true_top = exact.most_common(k)
+    approx_top = approx.most_common(k)
+    # ties at the k-th count make either word a correct answer
+    kth = true_top[-1][1] if true_top else 0
+    hits = sum(1 for w, _ in approx_top if exact[w] >= kth)
+    return {
+        "recall": hits / len(true_top) if true_top else 1.0,
+        "max_error": max((approx[w] - exact[w] for w in approx), default=0),
+        "bound": approx.bound(),
+        "guaranteed": len(approx.guaranteed(k)),
+        "exact_words": len(exact),
+        "monitored": len(approx),
+    }
+
+
+def main(argv=None):
+    from chat_parser import parse_chat
+    from chat_stats import word_frequencies
+
+    ap = argparse.ArgumentParser(
+        description="Compare approximate and exact top words per author."
+    )
+    ap.add_argument("chat")
+    ap.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY)
+    ap.add_argument("--top", type=int, default=10)
+    args = ap.parse_args(argv)
+
+    msgs = parse_chat(args.chat, cache=True)
+    exact = word_frequencies(msgs)
+    approx = word_frequencies(msgs, approx=args.capacity)
+    print(
+        f"{'author':<24} {'recall':>7} {'max err':>8} {'bound':>8} "
+        f"{'sure':>5} {'words':>8} {'kept':>6}"
+    )
+    for author, counts in exact.items():
+        r = compare_topk(counts, approx[author], args.top)
+        print(
+            f"{author:<24} {r['recall']:>7.0%} {r['max_error']:>8} "
+            f"{r['bound']:>8} {r['guaranteed']:>5} "
+            f"{r['exact_words']:>8} {r['monitored']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,50 +1,129 @@
+import os
 import re
 import sys
 from datetime import datetime
 
+from chat_parser import detect_chat_format, detect_format
+
+DATE_PREFIX = re.compile(r'(\d{1,2}/\d{1,2}/\d{2}),')
+
+def _line_date(line):
+    """Date of a message header line, or None for any other line"""
+    match = DATE_PREFIX.match(line)
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(1), '%m/%d/%y').date()
+    except ValueError:
+        return None
+
+def _reverse_lines(f, block_size=65536):
+    """Yield the lines of a binary file from last to first"""
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    head = b''
+    while pos > 0:
+        step = min(block_size, pos)
+        pos -= step
+        f.seek(pos)
+        lines = (f.read(step) + head).split(b'\n')
+        # the first piece may be the end of a line from the previous block
+        head = lines.pop(0)
+        yield from reversed(lines)
+    yield head
+
 def get_last_day_messages(input_file):
-    """Extract messages from the last day in the chat log"""
-    with open(input_file, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-    
+    """Extract messages from the last day in the chat log
+
+    The file is read backwards from the end, only as far as the first
+    message of an earlier day. Continuation lines of multi-line messages
+    stay with their message.
+    """
     messages = []
     last_date = None
-    
-    for line in lines:
-        line = line.strip()
-
-        match = re.match(r'(\d{1,2}/\d{1,2}/\d{2}),', line)
-        if match:
-            try:
-                date_str = match.group(1)
-                date_obj = datetime.strptime(date_str, '%m/%d/%y')
-                messages.append((date_obj.date(), line))
+    continuation = []
 
-                if last_date is None or date_obj.date() > last_date:
-                    last_date = date_obj.date()
-            except:
+    with open(input_file, 'rb') as f:
+        for raw in _reverse_lines(f):
+            line = raw.decode('utf-8').rstrip('\r')
+            date = _line_date(line)
+            if date is None:
+                continuation.append(line)
                 continue
-    
+            if last_date is None:
+                last_date = date
+            elif date != last_date:
+                break
+            continuation.reverse()
+            messages.append('\n'.join([line.strip()] + continuation).rstrip())
+            continuation = []
+
     if not messages:
         return [], None
-    
 
-    last_day_msgs = [msg[1] for msg in messages if msg[0] == last_date]
-    return last_day_msgs, last_date
+    messages.reverse()
+    return messages, last_date
+
+def rename_sender(line, name_map, fmt):
+    """line with its sender renamed, or None if it is not a header of fmt
+    whose sender is in name_map
+
+    Uses the format's own header regex, the one the parser matches, so
+    only the sender position of a header line is touched.
+    """
+    match = fmt.line_re.match(line.rstrip('\r\n'))
+    if not match or match.group(3) not in name_map:
+        return None
+    return line[:match.start(3)] + name_map[match.group(3)] + line[match.end(3):]
 
 def replace_names(messages, name_map):
     """Replace sender names in messages"""
     if not name_map:
         return messages
-    
-    replaced_messages = []
+
+    fmt = detect_format(messages)
+    out = []
     for line in messages:
-        for old_name, new_name in name_map.items():
+        renamed = rename_sender(line, name_map, fmt)
+        out.append(line if renamed is None else renamed)
+    return out
 
-            line = re.sub(rf'- {re.escape(old_name)}:', f'- {new_name}:', line)
-        replaced_messages.append(line)
-    
-    return replaced_messages
+def load_name_map(path):
+    """Read 'old name new_name' lines, the format main() asks for"""
+    name_map = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2:
+                name_map[' '.join(parts[:-1])] = parts[-1]
+    return name_map
+
+def anonymise_file(input_file, output_file, name_map, chunk_size=1 << 20):
+    """Stream a whole export to output_file with sender names replaced
+
+    Returns the number of lines whose sender was replaced.
+    """
+    fmt = detect_chat_format(input_file)
+    replaced = 0
+
+    def rename(line):
+        nonlocal replaced
+        renamed = rename_sender(line, name_map, fmt)
+        if renamed is None:
+            return line
+        replaced += 1
+        return renamed
+
+    with open(input_file, 'r', encoding='utf-8', newline='') as fin, \
+            open(output_file, 'w', encoding='utf-8', newline='') as fout:
+        while True:
+            lines = fin.readlines(chunk_size)
+            if not lines:
+                break
+            if name_map:
+                lines = [rename(line) for line in lines]
+            fout.writelines(lines)
+    return replaced
 
 def save_and_print(messages, output_file, title="Messages"):
     """Save messages to file and print to console"""
@@ -61,7 +140,14 @@ def save_and_print(messages, output_file, title="Messages"):
 
 def main():
     """Interactive chat log processor"""
-    
+
+    if len(sys.argv) == 5 and sys.argv[1] == '--anonymise':
+        # python helper.py --anonymise chat.txt anon.txt names.txt
+        _, _, input_file, output_file, names_file = sys.argv
+        count = anonymise_file(input_file, output_file, load_name_map(names_file))
+        print(f"Replaced {count} sender names, saved to '{output_file}'")
+        return
+
     if len(sys.argv) > 1:
         input_file = sys.argv[1]
     else: